@@ -4,9 +4,12 @@ from odoo.exceptions import UserError
 class KapalMaster(models.Model):
     _name = 'kapal.master'
     _description = 'Master Data Kapal'
+    # Autocomplete many2one cocok dengan nama maupun kode vessel
+    _rec_names_search = ['search_label']
 
     name = fields.Char(string='Vessel Name', required=True)
     vessel_code = fields.Char(string='Vessel Code', required=True)
+    search_label = fields.Char(compute='_compute_search_label', store=True, index='trigram')
     location_id = fields.Many2one(
         'stock.location',
         string='Location',
@@ -36,6 +39,11 @@ class KapalMaster(models.Model):
         string='Sparepart Line'
     )
 
+    @api.depends('name', 'vessel_code')
+    def _compute_search_label(self):
+        for record in self:
+            record.search_label = ' '.join(part for part in (record.name, record.vessel_code) if part)
+
     def action_generate_location(self):
         """Generate stock location from vessel_code + '/' + vessel name"""
         for record in self:
@@ -17,9 +17,16 @@
         'security/ir.model.access.csv',
         'security/ir_rule.xml',
         'data/sequence_data.xml',
+        'data/recompute_data.xml',
+        'data/ir_cron_data.xml',
+        'wizard/material_request_line_import_views.xml',
         'views/material_request_views.xml',
         'views/stock_picking_views.xml',
         'views/purchase_request_line_views.xml',
+        'views/stock_warehouse_views.xml',
+        'views/res_company_views.xml',
+        'views/material_request_approval_job_views.xml',
+        'report/material_request_report_views.xml',
     ],
     
     'license': 'OPL-1'
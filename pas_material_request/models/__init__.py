@@ -1,10 +1,24 @@
 from . import material_request
 from . import material_request_line
+from . import material_request_availability
+from . import material_request_approval_job
 
 from . import purchase_request
 from . import purchase_request_line
+from . import purchase_order
+from . import purchase_order_line
+from . import product_purchase_history
 
 from . import stock_picking
 from . import stock_move
+from . import stock_quant
 
-from . import stock_warehouse
\ No newline at end of file
+from . import stock_warehouse
+from . import stock_picking_type
+from . import stock_location
+
+from . import product_product
+
+from . import res_company
+from . import res_users
+from . import res_groups
@@ -1,10 +1,14 @@
 from datetime import timedelta, datetime
+from dateutil.relativedelta import relativedelta
 from collections import defaultdict
 import logging
+import time
 
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.fields import Command
 from odoo.exceptions import UserError
+from odoo.tools import float_round
+from odoo.tools.sql import create_index
 
 _logger = logging.getLogger(__name__)
 
@@ -16,25 +20,66 @@ _STATES = [
     ("done", "Done"),
 ]
 
+# Stored compute yang dihitung ulang oleh _recompute_stored_fields, urut per model
+_RECOMPUTE_FIELDS = [
+    ('apm.material.request.line', ['last_purchase_date', 'move_quantity', 'move_returned']),
+    ('apm.material.request', ['has_insufficient_stock', 'insufficient_stock_qty', 'delivery_status', 'search_label']),
+]
+_RECOMPUTE_CHECKPOINT_PARAM = 'apm_material_request.recompute_checkpoint.%s'
+_RECOMPUTE_DONE = 'done'
+
+# MR done/rejected yang ditutup lebih lama dari N bulan di-archive oleh cron
+_ARCHIVE_MONTHS_PARAM = 'apm_material_request.archive_after_months'
+_ARCHIVE_DEFAULT_MONTHS = 12
+_ARCHIVE_BATCH_SIZE = 1000
+_CLOSED_STATES = ('done', 'rejected')
+# Fallback approver default: user terakhir (name, login desc) di group ini
+_DEFAULT_APPROVER_GROUP = 'sales_team.group_sale_salesman'
+
 class MaterialRequest(models.Model):
     _name = 'apm.material.request'
     _inherit = ['mail.thread', 'mail.activity.mixin']
     _description = 'Material Request'
     _order = "id desc"
     _check_company_auto = True
+    # Autocomplete many2one: satu query ILIKE ke search_label (trigram index)
+    _rec_names_search = ['search_label']
 
     @api.model
     def _get_random_approver(self):
-        warehouse_group = self.env.ref("sales_team.group_sale_salesman", raise_if_not_found=False)
+        """Approver default company aktif: mr_approver_id company, atau user terakhir group salesman"""
+        approver_id = self._resolve_default_approver(self.env.company.id)
+        return self.env['res.users'].browse(approver_id) if approver_id else None
+
+    @api.model
+    @tools.ormcache('company_id')
+    def _resolve_default_approver(self, company_id):
+        company = self.env['res.company'].sudo().browse(company_id)
+        if company.mr_approver_id.active:
+            return company.mr_approver_id.id
+        warehouse_group = self.env.ref(_DEFAULT_APPROVER_GROUP, raise_if_not_found=False)
         if not warehouse_group:
-            return None
-        return warehouse_group.users[-1] if warehouse_group.users else None
-    
+            return False
+        # Sama dengan group.users[-1] tanpa memuat semua user group
+        approver = self.env['res.users'].sudo().search(
+            [('groups_id', 'in', warehouse_group.id)], order='name desc, login desc', limit=1)
+        return approver.id
+
+    @api.model
+    def _clear_resolver_cache(self):
+        """Dipanggil saat warehouse, picking type, location, approver company atau membership group berubah"""
+        self.env.registry.clear_cache()
+
     @api.model
     def _get_default_warehouse(self):
         """get default warehouse"""
-        return self.env['stock.warehouse'].search([('company_id', '=', self.env.company.id)], limit=1)
-    
+        return self.env['stock.warehouse'].browse(self._resolve_default_warehouse(self.env.company.id))
+
+    @api.model
+    @tools.ormcache('company_id')
+    def _resolve_default_warehouse(self, company_id):
+        return self.env['stock.warehouse'].sudo().search([('company_id', '=', company_id)], limit=1).id
+
     name = fields.Char(
         string="Request Number",
         required=True,
@@ -198,6 +243,10 @@ class MaterialRequest(models.Model):
         help="Summary otomatis dari department, jenis pembelian, dan vessel"
     )
     
+    search_label = fields.Char(
+        compute='_compute_search_label', store=True, index='trigram',
+        help="Nomor MR + vessel (nama & kode) + department, untuk name search")
+
     state = fields.Selection(
         selection=_STATES,
         string="Status",
@@ -221,26 +270,52 @@ class MaterialRequest(models.Model):
         string="Material to Request",
         copy=False,
         tracking=True,
-        required=True 
+        required=True,
+        # Line MR yang di-archive ikut tidak aktif, tetap tampil di form history
+        context={'active_test': False},
     )
+    active = fields.Boolean(default=True, tracking=True)
+
+    approval_job_id = fields.Many2one('apm.material.request.approval.job', 'Approval Job', readonly=True, copy=False)
+    approval_job_state = fields.Selection(related='approval_job_id.state', string='Approval Job Status')
+    approval_job_error = fields.Text(related='approval_job_id.error', string='Approval Job Error')
+    date_closed = fields.Datetime('Closed On', readonly=True, copy=False, index=True)
     
-    picking_ids = fields.Many2many('stock.picking', string='Transfers', compute='_compute_stock_picking', search='_search_stock_picking')
+    # Relation dikelola oleh stock.picking.mr_ids (stored compute dari move)
+    picking_ids = fields.Many2many(
+        'stock.picking',
+        relation='apm_material_request_stock_picking_rel',
+        column1='request_id',
+        column2='picking_id',
+        string='Transfers',
+        readonly=True,
+        copy=False)
     picking_count = fields.Integer(compute='_compute_stock_picking')
     
     mr_status = fields.Selection(selection=[
         ('return', 'Return'), 
         ('pickup', 'Pickup'), 
         ('returned', 'Returned')
-        ],compute='_compute_mr_status', string='MR Status')
+        ],compute='_compute_mr_status', string='MR Status', store=True, index=True)
     is_late = fields.Boolean(
         string="Is overdue",
         help="The products haven't been picked-up or returned in time",
         compute='_compute_is_late',
+        store=True,
+        index=True,
     )
-    next_action_date = fields.Datetime(string="Next Action", compute='_compute_mr_status')
-    has_pickable_lines = fields.Boolean(compute='_compute_has_action_lines')
-    has_returnable_lines = fields.Boolean(compute='_compute_has_action_lines')
-    mr_status_info = fields.Char(compute='_compute_mr_late_ifo')
+    next_action_date = fields.Datetime(string="Next Action", compute='_compute_mr_status', store=True, index=True)
+    has_pickable_lines = fields.Boolean(compute='_compute_has_action_lines', store=True)
+    has_returnable_lines = fields.Boolean(compute='_compute_has_action_lines', store=True)
+    mr_status_info = fields.Char(compute='_compute_mr_late_ifo', store=True)
+
+    availability_snapshot_ids = fields.One2many(
+        'apm.material.request.availability', 'request_id',
+        string='Availability Snapshot', readonly=True, copy=False)
+    availability_snapshot_date = fields.Datetime('Snapshot Date', readonly=True, copy=False)
+    availability_signature = fields.Char(
+        readonly=True, copy=False,
+        help="Checksum quant product MR saat snapshot, untuk deteksi perubahan stock")
 
     purchase_request_count = fields.Integer(
     string="Purchase Request Count",
@@ -248,6 +323,31 @@ class MaterialRequest(models.Model):
     store=False,
 )
 
+    def init(self):
+        # Partial index untuk filter overdue dan _cron_update_late_status
+        create_index(
+            self.env.cr,
+            'apm_material_request_next_action_open_idx',
+            self._table,
+            ['next_action_date'],
+            where="mr_status IN ('pickup', 'return')",
+        )
+        # Working set harian hanya MR aktif; MR archive tidak ikut membesarkan index ini
+        create_index(
+            self.env.cr,
+            'apm_material_request_active_company_state_idx',
+            self._table,
+            ['company_id', 'state'],
+            where="active IS TRUE",
+        )
+        create_index(
+            self.env.cr,
+            'apm_material_request_active_requested_by_idx',
+            self._table,
+            ['requested_by_id', 'id'],
+            where="active IS TRUE",
+        )
+
     @api.depends('purchase_request_id')
     def _compute_purchase_request_count(self):
         for record in self:
@@ -256,29 +356,16 @@ class MaterialRequest(models.Model):
     @api.depends('line_ids.product_id', 'line_ids.product_uom_qty', 'request_warehouse_id', 'location_id')
     def _compute_insufficient_stock(self):
         """Compute insufficient stock status & total shortage"""
+        self._set_insufficient_stock(self._get_line_available_qty())
+
+    def _set_insufficient_stock(self, available_by_line):
+        """Set insufficient stock fields dari hasil _get_line_available_qty"""
         for record in self:
             insufficient_lines = record.env['apm.material.request.line']
             total_shortage = 0.0
 
-            for line in record.line_ids.filtered(lambda l: l.product_uom_qty > 0):
-                # GET AVAILABLE STOCK - Use consistent warehouse context
-                # Prioritize warehouse over location for consistent stock checking
-                stock_context = {'warehouse': record.request_warehouse_id.id}
-
-                # Only add location context if location_id is properly set and valid
-                if record.location_id:
-                    try:
-                        stock_context['location'] = record.location_id.id
-                    except:
-                        # If location_id is invalid, don't use it
-                        pass
-
-                available_qty = line.product_id.with_context(stock_context).qty_available
-
-                # Debug logging for troubleshooting
-                if record.state in ['to_approve', 'approved']:
-                    _logger.info(f"Stock Check - Product: {line.product_id.name}, Demand: {line.product_uom_qty}, Available: {available_qty}, Context: {stock_context}")
-
+            for line in record._get_requested_lines():
+                available_qty = available_by_line[line.id]
                 if line.product_uom_qty > available_qty:
                     shortage = line.product_uom_qty - available_qty
                     total_shortage += shortage
@@ -286,7 +373,140 @@ class MaterialRequest(models.Model):
 
             record.has_insufficient_stock = bool(insufficient_lines)
             record.insufficient_stock_qty = total_shortage
-            
+
+    def _get_requested_lines(self):
+        """Lines dengan quantity > 0 yang ikut stock check dan picking"""
+        return self.line_ids.filtered(lambda l: l.product_uom_qty > 0)
+
+    def _get_stock_context(self):
+        """Stock context yang konsisten untuk semua stock check MR ini"""
+        self.ensure_one()
+        stock_context = {'warehouse': self.request_warehouse_id.id}
+        if self.location_id:
+            stock_context['location'] = self.location_id.id
+        return stock_context
+
+    def _is_time_phased(self):
+        """Transfer dengan periode: forecast diproyeksikan pada date_from / date_to"""
+        self.ensure_one()
+        return self.request_type == 'internal' and bool(self.date_from)
+
+    def _get_line_available_qty(self):
+        """Available qty per line untuk semua MR di self.
+
+        Lines dikelompokkan per (warehouse, location) context, lalu qty on hand
+        semua product dalam satu context diambil dengan satu grouped query.
+        Dibaca langsung dari stock_quant (tanpa availability cache), di
+        transaksi yang sama dengan _get_availability_signatures, sehingga
+        snapshot dan checksum-nya selalu menggambarkan stock yang sama.
+
+        :return: dict {line_id: available_qty}
+        """
+        lines_by_context = defaultdict(lambda: self.env['apm.material.request.line'])
+        for record in self:
+            context_key = tuple(sorted(record._get_stock_context().items()))
+            lines_by_context[context_key] |= record._get_requested_lines()
+
+        available_by_line = {}
+        for context_key, lines in lines_by_context.items():
+            qty_by_product = lines.product_id._get_qty_available_by_context(dict(context_key))
+            for line in lines:
+                available_by_line[line.id] = qty_by_product.get(line.product_id.id, 0.0)
+        return available_by_line
+
+    def _get_availability_signatures(self):
+        """Checksum quant product semua MR di self dalam satu grouped query
+
+        Berubah jika ada quant product MR yang dibuat, dihapus atau diubah
+        quantity / location-nya.
+
+        :return: dict {request_id: signature}
+        """
+        products = self._get_requested_lines().product_id
+        stats_by_product = {}
+        if products:
+            self.env['stock.quant'].flush_model(['product_id', 'location_id', 'quantity'])
+            self.env.cr.execute("""
+                SELECT product_id, COUNT(*), MAX(write_date), SUM(quantity), SUM(quantity * location_id)
+                  FROM stock_quant
+                 WHERE product_id IN %s
+              GROUP BY product_id
+            """, [tuple(products.ids)])
+            stats_by_product = {row[0]: row[1:] for row in self.env.cr.fetchall()}
+
+        signatures = {}
+        for record in self:
+            product_ids = sorted(set(record._get_requested_lines().product_id.ids))
+            stats = [stats_by_product.get(product_id, (0, None, 0.0, 0.0)) for product_id in product_ids]
+            signatures[record.id] = '%s:%s:%s:%s' % (
+                sum(stat[0] for stat in stats),
+                max((stat[1] for stat in stats if stat[1]), default=''),
+                float_round(sum(stat[2] for stat in stats), precision_digits=6),
+                float_round(sum(stat[3] for stat in stats), precision_digits=6),
+            )
+        return signatures
+
+    def _save_availability_snapshot(self, available_by_line):
+        """Simpan demand & available qty setiap line saat submit, satu create untuk semua MR
+
+        :param available_by_line: hasil _get_line_available_qty di transaksi ini
+        """
+        self.availability_snapshot_ids.unlink()
+        signatures = self._get_availability_signatures()
+        now = fields.Datetime.now()
+        vals_list = []
+        for record in self:
+            stock_context = str(record._get_stock_context())
+            for line in record._get_requested_lines():
+                available_qty = available_by_line[line.id]
+                vals_list.append({
+                    'request_id': record.id,
+                    'request_line_id': line.id,
+                    'product_id': line.product_id.id,
+                    'product_uom_qty': line.product_uom_qty,
+                    'available_qty': available_qty,
+                    'shortage_qty': max(line.product_uom_qty - available_qty, 0.0),
+                    'stock_context': stock_context,
+                })
+            record.availability_snapshot_date = now
+            record.availability_signature = signatures[record.id]
+        self.env['apm.material.request.availability'].create(vals_list)
+
+    def _get_snapshot_available_qty(self):
+        """Available qty per line, dari snapshot submit jika stock belum berubah
+
+        Snapshot dipakai jika checksum quant masih sama dan line / demand tidak
+        berubah sejak submit; MR lainnya dihitung ulang.
+
+        :return: dict {line_id: available_qty}
+        """
+        signatures = self._get_availability_signatures()
+        available_by_line = {}
+        stale = self.browse()
+        for record in self:
+            snapshot_by_line = {
+                snapshot.request_line_id.id: snapshot for snapshot in record.availability_snapshot_ids
+            }
+            lines = record._get_requested_lines()
+            if (
+                record.availability_signature
+                and record.availability_signature == signatures[record.id]
+                and set(snapshot_by_line) == set(lines.ids)
+                and all(snapshot_by_line[line.id].product_uom_qty == line.product_uom_qty for line in lines)
+            ):
+                available_by_line.update({line.id: snapshot_by_line[line.id].available_qty for line in lines})
+            else:
+                stale |= record
+        if stale:
+            available_by_line.update(stale._get_line_available_qty())
+        return available_by_line
+
+    @api.depends('name', 'vessel_id.name', 'vessel_id.vessel_code', 'department_id.name')
+    def _compute_search_label(self):
+        for record in self:
+            parts = [record.name, record.vessel_id.name, record.vessel_id.vessel_code, record.department_id.name]
+            record.search_label = ' '.join(part for part in parts if part)
+
     @api.depends('department_id', 'purchase_type', 'vessel_id')
     def _compute_request_summary(self):
         """Compute summary dari department, purchase_type, dan vessel"""
@@ -308,101 +528,111 @@ class MaterialRequest(models.Model):
         for record in self:
             if record.state == 'done':
                 continue
-            
-            record = record.with_company(record.company_id)
-            
+
+            source_info = record._get_warehouse_picking_info(record.request_warehouse_id)
+            dest_info = record._get_warehouse_picking_info(record.destination_id)
+
             # ✅ PICKING TYPE
-            record.picking_type_id = record._search_picking_type(record.request_warehouse_id)
-            record.return_picking_type_id = record._search_picking_type(record.destination_id)
+            record.picking_type_id = source_info['picking_type']
+            record.return_picking_type_id = dest_info['picking_type']
 
             # ✅ LOCATIONS DENGAN FALLBACK
             if record.picking_type_id:
-                record.location_id = record.picking_type_id.default_location_src_id.id
-                # record.location_dest_id = record.picking_type_id.default_location_dest_id.id
+                record.location_id = source_info['picking_type_location']
             else:
                 # FALLBACK: Gunakan warehouse stock locations
-                source_wh = record.request_warehouse_id
-                dest_wh = record.destination_id or source_wh
-                
-                source_loc = source_wh.lot_stock_id
-                dest_loc = dest_wh.lot_stock_id or source_loc
-                
-                if not source_loc:
-                    source_loc = self.env['stock.location'].search([
-                        ('usage', '=', 'internal'),
-                        ('company_id', '=', record.company_id.id)
-                    ], limit=1)
-                
-                record.location_id = source_loc.id
-                # record.location_dest_id = dest_loc.id
-            
+                record.location_id = source_info['lot_stock'] or source_info['internal_location']
+
             if record.vessel_id and record.vessel_id.location_id:
                 record.location_dest_id = record.vessel_id.location_id
             elif record.destination_id:
-                record.location_dest_id = record.destination_id.lot_stock_id
-    
+                record.location_dest_id = dest_info['lot_stock']
+
+    def _get_warehouse_picking_info(self, warehouse):
+        """Picking type & location MR untuk warehouse di company record, dari cache resolver
+
+        :return: dict {'picking_type', 'picking_type_location', 'lot_stock', 'internal_location'}
+        """
+        self.ensure_one()
+        picking_type_id, picking_type_location_id, lot_stock_id, internal_location_id = \
+            self._resolve_warehouse_picking_info(self.company_id.id, warehouse.id)
+        return {
+            'picking_type': self.env['stock.picking.type'].browse(picking_type_id),
+            'picking_type_location': self.env['stock.location'].browse(picking_type_location_id),
+            'lot_stock': self.env['stock.location'].browse(lot_stock_id),
+            'internal_location': self.env['stock.location'].browse(internal_location_id),
+        }
+
+    @api.model
+    @tools.ormcache('company_id', 'warehouse_id')
+    def _resolve_warehouse_picking_info(self, company_id, warehouse_id):
+        """Resolve picking type & location per (company, warehouse), di-cache di registry.
+
+        Cache di-clear saat stock.warehouse, stock.picking.type atau
+        stock.location berubah (lihat _clear_resolver_cache).
+
+        :return: tuple id (picking_type, picking_type_location, lot_stock, internal_location)
+        """
+        warehouse = self.env['stock.warehouse'].sudo().browse(warehouse_id)
+        picking_type = self.env['stock.picking.type']
+        if warehouse:
+            # Prioritas 1: Warehouse-specific internal type
+            picking_type = warehouse.int_type_id.sudo()
+            # Prioritas 2: Any internal picking type di warehouse
+            if not picking_type:
+                picking_type = picking_type.sudo().search([
+                    ('code', '=', 'internal'),
+                    ('warehouse_id', '=', warehouse.id)
+                ], limit=1)
+            # Prioritas 3: Any internal picking type di company
+            if not picking_type:
+                picking_type = picking_type.sudo().search([
+                    ('code', '=', 'internal'),
+                    ('warehouse_id.company_id', '=', company_id)
+                ], limit=1)
+
+        internal_location = self.env['stock.location'].sudo().search([
+            ('usage', '=', 'internal'),
+            ('company_id', '=', company_id)
+        ], limit=1)
+        return (
+            picking_type.id,
+            picking_type.default_location_src_id.id,
+            warehouse.lot_stock_id.id,
+            internal_location.id,
+        )
+
     def _search_picking_type(self, warehouse):
         """✅ FIXED: Proper picking type search"""
         self.ensure_one()
-        if not warehouse:
-            return self.env['stock.picking.type']
-        
-        # Prioritas 1: Warehouse-specific internal type
-        picking_type = warehouse.int_type_id
-        if picking_type:
-            return picking_type
-        
-        # Prioritas 2: Any internal picking type di warehouse
-        picking_type = self.env['stock.picking.type'].search([
-            ('code', '=', 'internal'),
-            ('warehouse_id', '=', warehouse.id)
-        ], limit=1)
-        if picking_type:
-            return picking_type
-        
-        # Prioritas 3: Any internal picking type di company
-        picking_type = self.env['stock.picking.type'].search([
-            ('code', '=', 'internal'),
-            ('warehouse_id.company_id', '=', self.company_id.id)
-        ], limit=1)
-        return picking_type
-    
+        return self._get_warehouse_picking_info(warehouse)['picking_type']
+
     def _search_location(self, request_type, destination_id):
         """✅ IMPROVED: Better location fallback"""
         if not request_type or not destination_id:
             return False
-        
+
         # Prioritas 1: Picking type locations (jika ada)
         if self.picking_type_id:
-            if request_type == 'inventory':
-                return self.picking_type_id.default_location_dest_id
-            else:
-                return self.picking_type_id.default_location_dest_id
-        
+            return self.picking_type_id.default_location_dest_id
+
         # Prioritas 2: Warehouse stock location
-        if destination_id.lot_stock_id:
-            return destination_id.lot_stock_id
-        
         # Prioritas 3: Any internal location
-        return self.env['stock.location'].search([
-            ('usage', '=', 'internal'),
-            ('company_id', '=', self.company_id.id)
-        ], limit=1)
-        
+        info = self._get_warehouse_picking_info(destination_id)
+        return info['lot_stock'] or info['internal_location']
+
     @api.depends("state")
     def _compute_is_editable(self):
         for rec in self:
             rec.is_editable = rec.state != 'draft'
             
-    @api.depends('line_ids.move_ids')
+    @api.depends('picking_ids')
     def _compute_stock_picking(self):
         for rec in self:
-            picking = rec.line_ids.mapped('move_ids.picking_id')
-            pickings = picking | picking.backorder_ids
-            rec.picking_ids = pickings
-            rec.picking_count = len(pickings)
+            rec.picking_count = len(rec.picking_ids)
             
     @api.depends(
+        'request_type',
         'line_ids.product_uom_qty',
         'line_ids.move_quantity',
         'line_ids.move_returned',
@@ -420,27 +650,57 @@ class MaterialRequest(models.Model):
             
     @api.depends('picking_ids', 'picking_ids.state')
     def _compute_delivery_status(self):
+        """Status delivery dari satu grouped query atas picking semua MR di self.
+
+        Perubahan state picking hanya men-trigger MR yang terhubung lewat
+        stock.picking.mr_ids, sehingga banyak picking yang divalidasi sekaligus
+        tetap dihitung dalam satu pass.
+        """
+        states_by_request = defaultdict(set)
+        request_ids = self._origin.ids
+        if request_ids:
+            picking_groups = self.env['stock.picking']._read_group(
+                [('mr_ids', 'in', request_ids)], ['mr_ids', 'state'])
+            for request, state in picking_groups:
+                states_by_request[request.id].add(state)
+
         for order in self:
-            if not order.picking_ids or all(p.state == 'cancel' for p in order.picking_ids):
+            states = states_by_request[order._origin.id]
+            if not states or states == {'cancel'}:
                 order.delivery_status = False
-            elif all(p.state in ['done', 'cancel'] for p in order.picking_ids):
+            elif states <= {'done', 'cancel'}:
                 order.delivery_status = 'full'
-            elif any(p.state == 'done' for p in order.picking_ids):
+            elif 'done' in states:
                 order.delivery_status = 'partial'
             else:
                 order.delivery_status = 'pending'
     
     @api.depends('next_action_date', 'mr_status')
     def _compute_is_late(self):
+        """Stored: dihitung ulang saat status berubah, dan oleh _cron_update_late_status
+        saat next_action_date terlewati"""
         now = fields.Datetime.now()
         for rec in self:
-            rec.is_late = (
+            rec.is_late = bool(
                 rec.mr_status in ['pickup', 'return']
                 and rec.next_action_date
                 and rec.next_action_date < now
             )
+
+    @api.model
+    def _cron_update_late_status(self):
+        """Tandai MR pickup/return yang next_action_date-nya sudah lewat sebagai late"""
+        overdue = self.search([
+            ('mr_status', 'in', ['pickup', 'return']),
+            ('is_late', '=', False),
+            ('next_action_date', '<', fields.Datetime.now()),
+        ])
+        if overdue:
+            overdue.modified(['next_action_date'])
+            self.env.flush_all()
+            _logger.info("Late status updated for %s material requests", len(overdue))
         
-    @api.depends('picking_ids.state', 'date_from', 'date_to')
+    @api.depends('picking_ids', 'picking_ids.state', 'request_type', 'has_returnable_lines', 'has_pickable_lines', 'date_from', 'date_to')
     def _compute_mr_status(self):
         for order in self:
             order.next_action_date = False
@@ -463,9 +723,9 @@ class MaterialRequest(models.Model):
             elif rec.mr_status == 'pickup' and not rec.is_late:
                 rec.mr_status_info = 'Booked'
             elif rec.mr_status == 'return' and rec.is_late:
-                rec.mr_status_info = 'Picked-up'
-            elif rec.mr_status == 'return' and not rec.is_late:
                 rec.mr_status_info = 'Late Return'
+            elif rec.mr_status == 'return' and not rec.is_late:
+                rec.mr_status_info = 'Picked-up'
             elif rec.mr_status == 'returned':
                 rec.mr_status_info =  'Returned'
             else:
@@ -522,6 +782,36 @@ class MaterialRequest(models.Model):
             vals['purchase_type'] = 'ga'  # Default G&A
         
         return super(MaterialRequest, self).create(vals)
+
+    def write(self, vals):
+        if 'state' in vals and 'date_closed' not in vals:
+            vals = {**vals, 'date_closed': fields.Datetime.now() if vals['state'] in _CLOSED_STATES else False}
+        res = super().write(vals)
+        if 'active' in vals:
+            self.line_ids.write({'active': vals['active']})
+        return res
+
+    @api.model
+    def _cron_archive_closed_requests(self):
+        """Archive MR done/rejected yang ditutup lebih dari N bulan lalu, per batch
+
+        N dari ir.config_parameter apm_material_request.archive_after_months
+        (default 12, 0 = nonaktif). MR lama tanpa date_closed memakai write_date.
+        """
+        months = int(self.env['ir.config_parameter'].sudo().get_param(_ARCHIVE_MONTHS_PARAM, _ARCHIVE_DEFAULT_MONTHS))
+        if months <= 0:
+            return
+        cutoff = fields.Datetime.now() - relativedelta(months=months)
+        domain = [
+            ('state', 'in', list(_CLOSED_STATES)),
+            '|', ('date_closed', '<', cutoff),
+            '&', ('date_closed', '=', False), ('write_date', '<', cutoff),
+        ]
+        requests = self.search(domain, limit=_ARCHIVE_BATCH_SIZE, order='id')
+        requests.action_archive()
+        remaining = self.search_count(domain) if len(requests) == _ARCHIVE_BATCH_SIZE else 0
+        _logger.info("Archived %s closed material requests, %s remaining", len(requests), remaining)
+        self.env['ir.cron']._notify_progress(done=len(requests), remaining=remaining)
     
     # === BUTTON METHODS ===
     def button_to_approve(self):
@@ -534,115 +824,129 @@ class MaterialRequest(models.Model):
             if not record.purchase_type:
                 raise UserError(_("Jenis Pembelian wajib diisi sebelum mengajukan approval."))
 
-        # Original logic
-        for record in self:
-            if record.name == _("New"):
-                record.name = self.env['ir.sequence'].next_by_code('apm.material.request') or _("New")
-
-        # Ensure stock computation is consistent before approval
-        _logger.info(f"=== BUTTON TO APPROVE: {record.name} ===")
-        _logger.info(f"Warehouse: {record.request_warehouse_id.name} (ID: {record.request_warehouse_id.id})")
-        _logger.info(f"Location: {record.location_id.name if record.location_id else 'None'} (ID: {record.location_id.id if record.location_id else 'None'})")
+        # Nomor MR dialokasikan sekaligus per company
+        new_name = _("New")
+        records_to_number = self.filtered(lambda r: r.name == new_name)
+        for company, records in records_to_number.grouped('company_id').items():
+            names = records.with_company(company)._reserve_request_names(len(records))
+            for record, name in zip(records, names):
+                record.name = name or new_name
 
         # Force recompute of insufficient stock before approval
-        for record in self:
-            # Trigger recompute of insufficient stock with current context
-            record._compute_insufficient_stock()
-
-            # Log stock status for debugging
-            for line in record.line_ids.filtered(lambda l: l.product_uom_qty > 0):
-                stock_context = {'warehouse': record.request_warehouse_id.id}
-                if record.location_id:
-                    try:
-                        stock_context['location'] = record.location_id.id
-                    except:
-                        pass
-
-                available_qty = line.product_id.with_context(stock_context).qty_available
-                _logger.info(f"Line {line.product_id.name}: Demand={line.product_uom_qty}, Available={available_qty}")
+        # Satu stock check untuk semua record, dipakai untuk compute dan logging
+        available_by_line = self._get_line_available_qty()
+        self._set_insufficient_stock(available_by_line)
+        # Snapshot untuk audit dan dipakai ulang saat approval
+        self._save_availability_snapshot(available_by_line)
 
         self.write({"state": "to_approve"})
                 
-    def _search_stock_picking(self, operator, value):
-        return [('line_ids.move_ids', operator, value)]
+    @api.model
+    def _reserve_request_names(self, count):
+        """Ambil ``count`` nomor MR dari sequence apm.material.request company aktif.
+
+        Sequence standard tanpa date range dialokasikan dengan satu query
+        nextval; implementasi lain memakai next_by_code per nomor.
+        """
+        sequence = self.env['ir.sequence'].sudo().search([
+            ('code', '=', 'apm.material.request'),
+            ('company_id', 'in', [self.env.company.id, False]),
+        ], order='company_id', limit=1)
+        if not sequence:
+            return [False] * count
+
+        if sequence.implementation != 'standard' or sequence.use_date_range:
+            return [sequence.next_by_code('apm.material.request') for _i in range(count)]
+
+        self.env.cr.execute(
+            "SELECT nextval(%s) FROM generate_series(1, %s)",
+            ['ir_sequence_%03d' % sequence.id, count],
+        )
+        return [sequence.get_next_char(number) for number, in self.env.cr.fetchall()]
 
     def button_draft(self):
         self.write({"state": "draft"})
 
     def button_approved(self):
-        self.ensure_one()
-        
+        """Approve satu atau banyak MR sekaligus.
+
+        Picking delivery & return semua MR dibuat dengan satu create dan
+        di-confirm dengan satu action_confirm, state ditulis sekali.
+        Company dengan mr_async_approval: MR diantrikan ke approval job.
+        """
+        if not self.env.context.get('apm_mr_sync_approval'):
+            async_records = self.filtered('company_id.mr_async_approval')
+            if async_records:
+                action = async_records._queue_approval()
+                (self - async_records).button_approved()
+                return action
+
         # VALIDASI
-        if not self.line_ids.filtered(lambda l: l.product_uom_qty > 0):
-            raise UserError(_("Tidak ada material dengan quantity > 0 untuk diproses."))
-        
-        if not self.request_warehouse_id:
-            raise UserError(_("Warehouse 'Request From' wajib diisi."))
-        
+        locations_by_record = {}
+        for record in self:
+            if record.state != 'to_approve':
+                raise UserError(_("Material Request %s tidak dalam status To be approved.") % record.name)
+
+            if not record._get_requested_lines():
+                raise UserError(_("Tidak ada material dengan quantity > 0 untuk diproses."))
+
+            if not record.request_warehouse_id:
+                raise UserError(_("Warehouse 'Request From' wajib diisi."))
+
+            source_location, dest_location = locations_by_record[record] = record._get_picking_locations()
+            if not source_location or not dest_location:
+                raise UserError(_(
+                    "Source Location: %s\n"
+                    "Dest Location: %s\n"
+                    "Mohon konfigurasi warehouse terlebih dahulu."
+                ) % (source_location.name or 'TIDAK DITEMUKAN', dest_location.name or 'TIDAK DITEMUKAN'))
+
         # ✅ AUTO CREATE PURCHASE REQUEST
-        if self.has_insufficient_stock:
-            purchase_request = self._create_auto_purchase_request()
-            _logger.info(f"✅ Auto-created PR {purchase_request.name} untuk {self.insufficient_stock_qty} units")
-        
-        # LOCATIONS
-        source_location = self.location_id
-        dest_location = self.location_dest_id
-        
-        # FALLBACK
-        if not source_location:
-            source_wh = self.request_warehouse_id
-            source_location = source_wh.lot_stock_id or self.env['stock.location'].search([
-                ('usage', '=', 'internal'),
-                ('company_id', '=', self.company_id.id)
-            ], limit=1)
-        
-        if not dest_location:
-            dest_wh = self.destination_id or self.request_warehouse_id
-            dest_location = dest_wh.lot_stock_id or source_location
-        
-        if not source_location or not dest_location:
-            raise UserError(_(
-                "Source Location: %s\n"
-                "Dest Location: %s\n"
-                "Mohon konfigurasi warehouse terlebih dahulu."
-            ) % (source_location.name or 'TIDAK DITEMUKAN', dest_location.name or 'TIDAK DITEMUKAN'))
-        
-        # CREATE PICKINGS
-        delivery, returned = self._prepare_stock_picking()
-        
-        _logger.info(f"=== APPROVE MR {self.name} ===")
-        _logger.info(f"Source Loc: {source_location.name} (ID: {source_location.id})")
-        _logger.info(f"Dest Loc: {dest_location.name} (ID: {dest_location.id})")
-        
-        # DELIVERY PICKING
-        picks = self.env['stock.picking'].with_context({
-            'is_material_request': True,
-            'default_material_request_id': self.id,
-        }).create(delivery)
-        picks.action_confirm()
-        
-        _logger.info(f"✅ Created delivery: {picks.name}")
-        
+        # Warehouse dengan mode konsolidasi: shortage dicatat, PR dibuat oleh _cron_consolidate_purchase_requests
+        short_records = self.filtered('has_insufficient_stock')
+        consolidated = short_records.filtered('request_warehouse_id.mr_consolidate_purchase_request')
+        consolidated._register_shortage()
+        for record in short_records - consolidated:
+            purchase_request = record._create_auto_purchase_request()
+            _logger.info(f"✅ Auto-created PR {purchase_request.name} untuk {record.insufficient_stock_qty} units")
+
+        # PREPARE PICKINGS
+        delivery_vals_list = []
+        return_vals_list = []
+        records_with_return = self.browse()
+        for record in self:
+            source_location, dest_location = locations_by_record[record]
+            _logger.info(f"=== APPROVE MR {record.name} ===")
+            _logger.info(f"Source Loc: {source_location.name} (ID: {source_location.id})")
+            _logger.info(f"Dest Loc: {dest_location.name} (ID: {dest_location.id})")
+
+            delivery, returned = record._prepare_stock_picking()
+            delivery_vals_list.append(delivery)
+            if record.request_type == 'internal' and returned:
+                return_vals_list.append(returned)
+                records_with_return |= record
+
+        # CREATE & CONFIRM PICKINGS
+        Picking = self.env['stock.picking'].with_context(is_material_request=True)
+        picks = Picking.create(delivery_vals_list)
+        returns = Picking.create(return_vals_list)
+        (picks | returns).action_confirm()
+        _logger.info(f"✅ Created delivery: {', '.join(picks.mapped('name'))}")
+
         # RETURN PICKING
-        if self.request_type == 'internal' and returned:
-            returns = self.env['stock.picking'].with_context({
-                'is_material_request': True,
-                'default_material_request_id': self.id,
-            }).create(returned)
-            returns.action_confirm()
-            
+        if returns:
             moves_by_line = defaultdict(lambda: {'picks': self.env['stock.move'], 'returns': self.env['stock.move']})
-            
+
             for move in picks.move_ids:
                 if move.state in ('done', 'cancel'):
                     continue
                 moves_by_line[move.material_request_line_id]['picks'] |= move
-                
+
             for move in returns.move_ids:
                 if move.state in ('done', 'cancel'):
                     continue
                 moves_by_line[move.material_request_line_id]['returns'] |= move
-            
+
             returns.move_ids._do_unreserve()
             for moves in moves_by_line.values():
                 if moves['returns']:
@@ -650,27 +954,41 @@ class MaterialRequest(models.Model):
                         'move_orig_ids': [Command.link(pick.id) for pick in moves['picks']],
                         'procure_method': 'make_to_order',
                     })
-            
-            returns.return_id = picks
+
+            pick_by_record = dict(zip(self, picks))
+            for record, return_picking in zip(records_with_return, returns):
+                return_picking.return_id = pick_by_record[record]
             returns.move_ids._recompute_state()
-            _logger.info(f"✅ Created return: {returns.name}")
-        
+            _logger.info(f"✅ Created return: {', '.join(returns.mapped('name'))}")
+
         # UPDATE STATE
         self.write({"state": "approved"})
         # ✅ NO RETURN - ODOO AUTO-REFRESH FORM
 
+    def _queue_approval(self):
+        """Antrikan approval ke apm.material.request.approval.job, UI langsung kembali"""
+        for record in self:
+            if record.state != 'to_approve':
+                raise UserError(_("Material Request %s tidak dalam status To be approved.") % record.name)
+            if record.approval_job_state in ('queued', 'running'):
+                raise UserError(_("Approval Material Request %s sedang diproses.") % record.name)
+        self.env['apm.material.request.approval.job']._enqueue(self)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Approval Queued"),
+                'message': _("%s Material Request diproses di background.", len(self)),
+                'type': 'info',
+                'sticky': False,
+                'next': {'type': 'ir.actions.client', 'tag': 'soft_reload'},
+            }
+        }
+
     def _create_auto_purchase_request(self):
         """Create PR untuk insufficient stock lines"""
         # Use consistent stock checking logic
-        stock_context = {'warehouse': self.request_warehouse_id.id}
-        if self.location_id:
-            try:
-                stock_context['location'] = self.location_id.id
-            except:
-                pass
-
-        insufficient_lines = self.line_ids.filtered(lambda l: l.product_uom_qty > 0 and
-                                                l.product_uom_qty > l.product_id.with_context(stock_context).qty_available)
+        insufficient_lines = self._register_shortage()
 
         if not insufficient_lines:
             return False
@@ -684,14 +1002,12 @@ class MaterialRequest(models.Model):
         # CREATE PURCHASE LINES
         purchase_lines = []
         for line in insufficient_lines:
-            available_qty = line.product_id.with_context(stock_context).qty_available
-            shortage_qty = line.product_uom_qty - available_qty
-
             purchase_lines.append(Command.create({
                 'product_id': line.product_id.id,
                 'product_uom_id': line.product_uom_id.id,
-                'product_qty': shortage_qty,
+                'product_qty': line.shortage_qty,
                 'material_request_line_id': line.id,
+                'material_request_line_ids': [Command.link(line.id)],
                 'description': f"Shortage MR {self.name}: {line.name or line.product_id.name}",
             }))
 
@@ -710,6 +1026,67 @@ class MaterialRequest(models.Model):
 
         return purchase_request
 
+    def _register_shortage(self):
+        """Simpan shortage_qty setiap line dari satu stock check untuk semua MR di self
+
+        :return: lines yang shortage
+        """
+        available_by_line = self._get_snapshot_available_qty()
+        insufficient_lines = self._get_requested_lines().filtered(
+            lambda l: l.product_uom_qty > available_by_line[l.id])
+        for line in insufficient_lines:
+            line.shortage_qty = line.product_uom_qty - available_by_line[line.id]
+        return insufficient_lines
+
+    @api.model
+    def _cron_consolidate_purchase_requests(self):
+        """Gabungkan shortage MR approved per company & warehouse menjadi satu PR.
+
+        Hanya untuk warehouse dengan mr_consolidate_purchase_request. Setiap
+        product (per UoM) menjadi satu PR line yang terhubung ke semua MR line
+        asalnya lewat material_request_line_ids. Semua PR dibuat dengan satu create.
+        """
+        lines = self.env['apm.material.request.line'].search([
+            ('shortage_qty', '>', 0),
+            ('purchase_request_line_ids', '=', False),
+            ('request_id.state', 'in', ['approved', 'done']),
+            ('request_id.request_warehouse_id.mr_consolidate_purchase_request', '=', True),
+        ])
+        if not lines:
+            return self.env['purchase.request']
+
+        now = fields.Datetime.now()
+        request_vals_list = []
+        lines_by_group = lines.grouped(lambda l: (l.company_id, l.request_id.request_warehouse_id))
+        for (company, warehouse), group_lines in lines_by_group.items():
+            purchase_lines = []
+            lines_by_product = group_lines.grouped(lambda l: (l.product_id, l.product_uom_id))
+            for (product, uom), product_lines in lines_by_product.items():
+                purchase_lines.append(Command.create({
+                    'product_id': product.id,
+                    'product_uom_id': uom.id,
+                    'product_qty': sum(product_lines.mapped('shortage_qty')),
+                    'material_request_line_ids': [Command.set(product_lines.ids)],
+                    'description': f"Shortage MR {', '.join(product_lines.request_id.mapped('name'))}: {product.name}",
+                }))
+
+            request_vals = {
+                'company_id': company.id,
+                'date_start': now,
+                'description': f"Konsolidasi shortage Material Request {warehouse.name}",
+                'line_ids': purchase_lines,
+            }
+            if warehouse.in_type_id:
+                request_vals['picking_type_id'] = warehouse.in_type_id.id
+            request_vals_list.append(request_vals)
+
+        purchase_requests = self.env['purchase.request'].create(request_vals_list)
+        purchase_requests.button_to_approve()
+        _logger.info(
+            "Consolidated %s material request lines into purchase requests %s",
+            len(lines), ', '.join(purchase_requests.mapped('name')))
+        return purchase_requests
+
     def button_rejected(self):
         self.write({"state": "draft"})
     
@@ -720,34 +1097,102 @@ class MaterialRequest(models.Model):
         self.ensure_one()
         self.write({"state": "done"})
         
-    # === FIXED: _prepare_stock_picking ===
-    def _prepare_stock_picking(self):
-        """✅ FIXED: Return (delivery_dict, returned_dict_or_False) + EXPLICIT LOCATIONS"""
+    # === BULK RECOMPUTE ===
+    @api.model
+    def _recompute_stored_fields(self, chunk_size=1000, reset=False):
+        """Hitung ulang stored compute MR & MR line per chunk.
+
+        Setiap chunk di-commit dan cache di-clear, id terakhir disimpan sebagai
+        checkpoint di ir.config_parameter sehingga proses yang terputus bisa
+        dilanjutkan dengan memanggil method ini lagi. Model yang sudah selesai
+        ditandai 'done' dan dilewati; semua checkpoint dihapus setelah model
+        terakhir selesai. Bisa dipanggil dari
+        server action atau odoo shell:
+
+            env['apm.material.request']._recompute_stored_fields(chunk_size=500)
+
+        :param reset: abaikan checkpoint dan mulai dari awal
+        :return: dict {model: jumlah record yang dihitung ulang}
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        if reset:
+            for model_name, _field_names in _RECOMPUTE_FIELDS:
+                ICP.set_param(_RECOMPUTE_CHECKPOINT_PARAM % model_name, False)
+
+        result = {}
+        for model_name, field_names in _RECOMPUTE_FIELDS:
+            checkpoint_param = _RECOMPUTE_CHECKPOINT_PARAM % model_name
+            checkpoint = ICP.get_param(checkpoint_param, 0)
+            # Model yang sudah selesai di run yang terputus tidak dihitung ulang
+            if checkpoint == _RECOMPUTE_DONE:
+                result[model_name] = 0
+                continue
+            last_id = int(checkpoint)
+
+            Model = self.env[model_name].with_context(active_test=False)
+            total = Model.search_count([('id', '>', last_id)])
+            fields_to_compute = [Model._fields[fname] for fname in field_names]
+            _logger.info("Recompute %s %s: %s records from id > %s", model_name, field_names, total, last_id)
+
+            done = 0
+            started = time.monotonic()
+            while True:
+                records = Model.search([('id', '>', last_id)], order='id', limit=chunk_size)
+                if not records:
+                    break
+
+                for field in fields_to_compute:
+                    self.env.add_to_compute(field, records)
+                self.env.flush_all()
+
+                last_id = records.ids[-1]
+                done += len(records)
+                ICP.set_param(checkpoint_param, last_id)
+                self.env.cr.commit()
+                self.env.invalidate_all()
+
+                elapsed = time.monotonic() - started
+                _logger.info(
+                    "Recompute %s: %s/%s (%.1f%%), %.1f records/s, checkpoint id %s",
+                    model_name, done, total, 100.0 * done / (total or 1), done / (elapsed or 1), last_id)
+
+            ICP.set_param(checkpoint_param, _RECOMPUTE_DONE)
+            self.env.cr.commit()
+            result[model_name] = done
+
+        # Semua model selesai: run berikutnya mulai dari awal
+        for model_name, _field_names in _RECOMPUTE_FIELDS:
+            ICP.set_param(_RECOMPUTE_CHECKPOINT_PARAM % model_name, False)
+        self.env.cr.commit()
+        return result
+
+    def _get_picking_locations(self):
+        """Return (source_location, dest_location) dari computed fields + fallback warehouse"""
         self.ensure_one()
-        
-        # GET LOCATIONS FROM COMPUTED FIELDS + FALLBACK
         source_location = self.location_id
         dest_location = self.location_dest_id
         
         # FINAL FALLBACK
         if not source_location:
-            source_wh = self.request_warehouse_id
-            source_location = source_wh.lot_stock_id or self.env['stock.location'].search([
-                ('usage', '=', 'internal'),
-                ('company_id', '=', self.company_id.id)
-            ], limit=1)
-        
+            source_info = self._get_warehouse_picking_info(self.request_warehouse_id)
+            source_location = source_info['lot_stock'] or source_info['internal_location']
+
         if not dest_location:
             dest_wh = self.destination_id or self.request_warehouse_id
-            dest_location = dest_wh.lot_stock_id or source_location
+            dest_location = self._get_warehouse_picking_info(dest_wh)['lot_stock'] or source_location
+        
+        return source_location, dest_location
+
+    # === FIXED: _prepare_stock_picking ===
+    def _prepare_stock_picking(self):
+        """✅ FIXED: Return (delivery_dict, returned_dict_or_False) + EXPLICIT LOCATIONS"""
+        self.ensure_one()
+        
+        # GET LOCATIONS FROM COMPUTED FIELDS + FALLBACK
+        source_location, dest_location = self._get_picking_locations()
         
         # PICKING TYPE
-        picking_type = self.picking_type_id
-        if not picking_type:
-            picking_type = self.request_warehouse_id.int_type_id or self.env['stock.picking.type'].search([
-                ('code', '=', 'internal'),
-                ('warehouse_id.company_id', '=', self.company_id.id)
-            ], limit=1)
+        picking_type = self.picking_type_id or self._search_picking_type(self.request_warehouse_id)
         
         if not picking_type:
             raise UserError(_("Internal Transfer picking type tidak ditemukan!"))
@@ -0,0 +1,198 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import logging
+import threading
+import time
+import traceback
+
+import psycopg2
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.service.model import PG_CONCURRENCY_ERRORS_TO_RETRY
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+_WORKERS_PARAM = 'apm_material_request.approval_job_workers'
+_DEFAULT_WORKERS = 2
+# Satu run cron berhenti mengambil job baru _RUN_TIME_MARGIN detik sebelum batas waktu
+# real cron worker (limit_time_real_cron / limit_time_real), sisa job lewat _trigger
+_RUN_TIME_MARGIN = 30
+# Dipakai jika batas waktu cron tidak di-set (0 = tanpa batas)
+_DEFAULT_RUN_TIME_LIMIT = 240
+# Job running lebih lama dari ini dianggap worker-nya mati (transaksi sudah rollback)
+_STALE_RUNNING_AFTER = timedelta(hours=1)
+# Job yang gagal karena konflik transaksi atau worker-nya mati diantrikan ulang sampai
+# batas ini, lalu failed
+_MAX_ATTEMPTS = 5
+
+
+class MaterialRequestApprovalJob(models.Model):
+    _name = 'apm.material.request.approval.job'
+    _description = 'Material Request Approval Job'
+    _order = 'id desc'
+    _rec_name = 'request_id'
+
+    request_id = fields.Many2one(
+        'apm.material.request', 'Material Request', required=True, readonly=True, index=True, ondelete='cascade')
+    company_id = fields.Many2one(related='request_id.company_id', store=True, index=True)
+    user_id = fields.Many2one('res.users', 'Queued By', required=True, readonly=True)
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='queued', required=True, readonly=True, index=True)
+    error = fields.Text('Error', readonly=True)
+    date_started = fields.Datetime('Started', readonly=True)
+    date_done = fields.Datetime('Finished', readonly=True)
+    attempt_count = fields.Integer('Attempts', readonly=True)
+
+    @api.model
+    def _enqueue(self, requests):
+        """Buat satu job per MR dan bangunkan cron worker"""
+        jobs = self.sudo().create([{
+            'request_id': request.id,
+            'user_id': self.env.uid,
+        } for request in requests])
+        for request, job in zip(requests, jobs):
+            request.approval_job_id = job
+        self._trigger_worker()
+        return jobs
+
+    @api.model
+    def _trigger_worker(self):
+        cron = self.env.ref('apm_material_request.ir_cron_material_request_approval_job', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+    def action_retry(self):
+        failed = self.filtered(lambda job: job.state == 'failed')
+        if not failed:
+            raise UserError(_("Hanya job dengan status Failed yang bisa diulang."))
+        failed.write({'state': 'queued', 'error': False, 'date_started': False, 'date_done': False, 'attempt_count': 0})
+        self._trigger_worker()
+
+    @api.model
+    def _cron_process_jobs(self):
+        """Proses job approval di beberapa thread, masing-masing dengan cursor sendiri"""
+        stale = self.search([
+            ('state', '=', 'running'),
+            ('date_started', '<', fields.Datetime.now() - _STALE_RUNNING_AFTER),
+        ])
+        if stale:
+            stale._requeue(_("Worker berhenti sebelum job selesai, kemungkinan melewati batas waktu cron."))
+            self.env.cr.commit()
+
+        workers = max(int(self.env['ir.config_parameter'].sudo().get_param(_WORKERS_PARAM, _DEFAULT_WORKERS)), 1)
+        deadline = time.monotonic() + self._get_run_time_limit()
+        registry = self.env.registry
+        dbname = self.env.cr.dbname
+        # Job yang sudah diambil di run ini (termasuk yang diantrikan ulang) tidak diambil lagi
+        claimed_ids = set()
+
+        def worker():
+            threading.current_thread().dbname = dbname
+            processed = 0
+            while time.monotonic() < deadline:
+                try:
+                    with registry.cursor() as cr:
+                        job = self.with_env(self.env(cr=cr))._claim_next(claimed_ids)
+                        if not job:
+                            break
+                        claimed_ids.add(job.id)
+                        job._run()
+                except Exception:
+                    # Error di luar approval (claim/commit/cursor); job yang sempat running
+                    # diantrikan ulang oleh pengecekan stale
+                    _logger.exception("Unexpected error while processing material request approval job")
+                processed += 1
+            return processed
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='apm_mr_approval') as executor:
+            processed = sum(executor.map(lambda _i: worker(), range(workers)))
+
+        if processed:
+            _logger.info("Processed %s material request approval jobs", processed)
+        if self.search_count([('state', '=', 'queued')], limit=1):
+            self._trigger_worker()
+
+    @api.model
+    def _get_run_time_limit(self):
+        """Detik satu run cron boleh mengambil job baru, di bawah batas waktu real cron worker"""
+        limit = config['limit_time_real_cron']
+        if limit is None or limit < 0:
+            # -1: cron worker memakai limit_time_real
+            limit = config['limit_time_real']
+        if not limit or limit <= 0:
+            return _DEFAULT_RUN_TIME_LIMIT
+        return max(limit - _RUN_TIME_MARGIN, limit / 2)
+
+    @api.model
+    def _claim_next(self, exclude_ids=()):
+        """Ambil satu job queued dengan SKIP LOCKED lalu commit status running"""
+        self.env.cr.execute("""
+            SELECT id FROM apm_material_request_approval_job
+             WHERE state = 'queued'
+               AND id != ALL(%s)
+          ORDER BY id
+             LIMIT 1
+               FOR UPDATE SKIP LOCKED
+        """, [list(exclude_ids)])
+        row = self.env.cr.fetchone()
+        if not row:
+            return self.browse()
+        job = self.browse(row[0])
+        job.write({
+            'state': 'running',
+            'date_started': fields.Datetime.now(),
+            'attempt_count': job.attempt_count + 1,
+        })
+        self.env.cr.commit()
+        return job
+
+    def _run(self):
+        """Approve MR sebagai user yang mengantrikan.
+
+        Konflik transaksi (serialization failure, deadlock, lock) me-rollback
+        approval dan mengantrikan job ulang sampai _MAX_ATTEMPTS. Error lain
+        (bisnis maupun bug) me-rollback approval dan menandai job failed dengan
+        pesan error yang tampil di MR.
+        """
+        self.ensure_one()
+        request = self.request_id.with_user(self.user_id).with_company(self.request_id.company_id)
+        try:
+            with self.env.cr.savepoint():
+                request.with_context(apm_mr_sync_approval=True).button_approved()
+        except Exception as e:
+            concurrency_error = isinstance(e, psycopg2.OperationalError) and e.pgcode in PG_CONCURRENCY_ERRORS_TO_RETRY
+            if concurrency_error:
+                _logger.info("Approval job %s for %s hit a concurrency error, requeued", self.id, self.request_id.name)
+                error = str(e)
+            elif isinstance(e, UserError):
+                _logger.info("Approval job %s for %s failed: %s", self.id, self.request_id.name, e)
+                error = str(e)
+            else:
+                _logger.exception("Approval job %s for %s failed", self.id, self.request_id.name)
+                error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+            # Transaksi bisa sudah tidak valid (snapshot, IntegrityError), rollback seluruhnya
+            # sebelum menulis status; status running sudah di-commit saat claim
+            self.env.cr.rollback()
+            self.env.invalidate_all()
+            if concurrency_error:
+                self._requeue(error)
+            else:
+                self.write({'state': 'failed', 'error': error, 'date_done': fields.Datetime.now()})
+        else:
+            self.write({'state': 'done', 'error': False, 'date_done': fields.Datetime.now()})
+
+    def _requeue(self, error):
+        """Antrikan ulang job; job yang sudah _MAX_ATTEMPTS kali diambil ditandai failed"""
+        exhausted = self.filtered(lambda job: job.attempt_count >= _MAX_ATTEMPTS)
+        exhausted.write({
+            'state': 'failed',
+            'error': _("Gagal setelah %(attempts)s percobaan: %(error)s", attempts=_MAX_ATTEMPTS, error=error),
+            'date_done': fields.Datetime.now(),
+        })
+        (self - exhausted).write({'state': 'queued', 'error': error, 'date_started': False})
@@ -0,0 +1,20 @@
+from odoo import fields, models
+
+
+class MaterialRequestAvailability(models.Model):
+    _name = 'apm.material.request.availability'
+    _description = 'Material Request Availability Snapshot'
+    _order = 'request_id, id'
+
+    request_id = fields.Many2one(
+        'apm.material.request', string='Material Request',
+        required=True, ondelete='cascade', index=True, readonly=True)
+    request_line_id = fields.Many2one(
+        'apm.material.request.line', string='Material Request Line',
+        ondelete='cascade', readonly=True)
+    company_id = fields.Many2one(related='request_id.company_id', store=True, index=True)
+    product_id = fields.Many2one('product.product', 'Product', required=True, readonly=True)
+    product_uom_qty = fields.Float('Demand', digits='Product Unit of Measure', readonly=True)
+    available_qty = fields.Float('Available', digits='Product Unit of Measure', readonly=True)
+    shortage_qty = fields.Float('Shortage', digits='Product Unit of Measure', readonly=True)
+    stock_context = fields.Char('Stock Context', readonly=True)
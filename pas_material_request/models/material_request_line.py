@@ -5,6 +5,7 @@ import logging
 from odoo.exceptions import ValidationError
 
 from odoo import api, fields, models, _
+from odoo.tools.sql import create_index
 
 
 _logger = logging.getLogger(__name__)
@@ -22,6 +23,7 @@ class MaterialRequestLine(models.Model):
         required=True, ondelete='cascade', index=True, copy=False)
     
     sequence = fields.Integer(string="Sequence", default=10)
+    active = fields.Boolean(default=True)
     
     company_id = fields.Many2one(
         'res.company', 'Company',
@@ -89,9 +91,31 @@ class MaterialRequestLine(models.Model):
     move_returned = fields.Float(string='Returned Qty', compute='_compute_qty', store=True)
 
     move_ids = fields.One2many('stock.move', 'material_request_line_id', string='Stock Moves')
+
+    shortage_qty = fields.Float(
+        'Shortage Qty', digits='Product Unit of Measure', readonly=True, copy=False,
+        help="Kekurangan stock saat MR di-approve")
+    purchase_request_line_ids = fields.Many2many(
+        'purchase.request.line',
+        relation='apm_mr_line_purchase_request_line_rel',
+        column1='material_request_line_id',
+        column2='purchase_request_line_id',
+        string='Purchase Request Lines',
+        readonly=True,
+        copy=False)
     
     forecast_availability = fields.Float('Forecast Availability', compute='_compute_forecast_information', digits='Product Unit of Measure', compute_sudo=True)
+    forecast_return_availability = fields.Float(
+        'Forecast at Return', compute='_compute_forecast_information', digits='Product Unit of Measure', compute_sudo=True,
+        help="Proyeksi stock warehouse asal pada End Date dikurangi demand (Transfer dengan periode)")
     
+    def init(self):
+        # Partial index: lookup line MR aktif tanpa menyentuh line MR yang sudah di-archive
+        create_index(self.env.cr, 'apm_material_request_line_active_request_idx',
+                     self._table, ['request_id'], where="active IS TRUE")
+        create_index(self.env.cr, 'apm_material_request_line_active_product_idx',
+                     self._table, ['product_id'], where="active IS TRUE")
+
     # === ONCHANGE METHODS ===
     # @api.onchange('product_id')
     # def _onchange_product_id(self):
@@ -103,18 +127,12 @@ class MaterialRequestLine(models.Model):
     @api.depends('product_id')
     def _compute_last_purchase_date(self):
         """Ambil tanggal PO terakhir untuk product ini"""
+        last_purchases = self.env['apm.product.purchase.history']._get_last_purchase_map(
+            self.product_id, self.company_id | self.env.company)
         for line in self:
-            if not line.product_id:
-                line.last_purchase_date = False
-                continue
-            
-            last_po = self.env['purchase.order'].search([
-                ('state', 'in', ['purchase', 'done']),
-                ('order_line.product_id', '=', line.product_id.id),
-            ], order='date_order desc', limit=1)
-            
-            if last_po:
-                line.last_purchase_date = last_po.date_order.date()
+            last_purchase = last_purchases.get((line.product_id.id, (line.company_id or self.env.company).id))
+            if last_purchase and last_purchase.date_order:
+                line.last_purchase_date = last_purchase.date_order.date()
             else:
                 line.last_purchase_date = False
     
@@ -162,135 +180,106 @@ class MaterialRequestLine(models.Model):
 
     @api.depends('move_ids.quantity', 'move_ids.state')
     def _compute_qty(self):
+        """Quantity delivered / returned dari satu grouped query atas done moves semua line"""
+        qty_by_line = defaultdict(float)
+        line_ids = self._origin.ids
+        if line_ids:
+            self.env['stock.move'].flush_model(['material_request_line_id', 'state', 'quantity', 'picking_id'])
+            self.env['stock.picking'].flush_model(['return_id'])
+            self.env.cr.execute("""
+                SELECT move.material_request_line_id, picking.return_id IS NOT NULL, SUM(move.quantity)
+                  FROM stock_move move
+             LEFT JOIN stock_picking picking ON picking.id = move.picking_id
+                 WHERE move.material_request_line_id IN %s
+                   AND move.state = 'done'
+              GROUP BY 1, 2
+            """, [tuple(line_ids)])
+            for line_id, is_return, quantity in self.env.cr.fetchall():
+                qty_by_line[line_id, is_return] += quantity or 0.0
+
         for rec in self:
-            qty_delivered = qty_returned = 0
-            for move in rec.move_ids.filtered(lambda x: x.state == 'done'):
-                if move.picking_id.return_id:
-                    qty_returned += move.quantity
-                else:
-                    qty_delivered += move.quantity
-            
-            rec.move_quantity = qty_delivered
-            rec.move_returned = qty_returned
+            rec.move_quantity = qty_by_line[rec._origin.id, False]
+            rec.move_returned = qty_by_line[rec._origin.id, True]
             
-    @api.depends('product_id', 'product_uom_qty', 'request_id.picking_type_id', 'request_id.state', 'request_id.location_id', 'request_id.date_to')
+    @api.depends('product_id', 'product_uom_qty', 'request_id.picking_type_id', 'request_id.state', 'request_id.location_id',
+                 'request_id.request_type', 'request_id.date_from', 'request_id.date_to')
     def _compute_forecast_information(self):
-        """ Compute forecasted information of the related product by warehouse."""
-        for line in self:
-            line.forecast_availability = 0.0  # Default value
-        
-        # Skip jika tidak ada product
-        lines_with_product = self.filtered('product_id')
-        if not lines_with_product:
-            return
-        
+        """ Compute forecasted information of the related product by warehouse.
+
+        Transfer dengan periode (date_from/date_to) diproyeksikan pada tanggal
+        pickup dan return lewat availability timeline; request lain memakai
+        stock saat ini.
+        """
+        self.forecast_availability = 0.0  # Default value
+        self.forecast_return_availability = 0.0
+
         # Set default untuk non-storable products
+        lines_with_product = self.filtered('product_id')
         not_storable_lines = lines_with_product.filtered(lambda l: not l.product_id.is_storable)
         for line in not_storable_lines:
-            line.forecast_availability = line.product_uom_qty
-        
-        # Hanya process storable products
-        storable_lines = lines_with_product - not_storable_lines
+            line.forecast_availability = line.forecast_return_availability = line.product_uom_qty
+
+        # Hanya process storable products yang punya request
+        storable_lines = (lines_with_product - not_storable_lines).filtered('request_id')
         if not storable_lines:
             return
-        
-        now = fields.Datetime.now()
-        
-        def safe_key_virtual_available(request, incoming=False):
-            """Safe version of key_virtual_available dengan error handling"""
-            try:
-                # Safety check untuk location_id dan location_dest_id
-                source_wh_id = False
-                dest_wh_id = False
 
-                if request.request_id.location_id:
-                    source_wh_id = request.request_id.location_id.warehouse_id.id
-                elif request.request_id.request_warehouse_id:
-                    source_wh_id = request.request_id.request_warehouse_id.id
-
-                if request.request_id.location_dest_id:
-                    dest_wh_id = request.request_id.location_dest_id.warehouse_id.id
-                elif request.request_id.destination_id:
-                    dest_wh_id = request.request_id.destination_id.id
-
-                warehouse_id = dest_wh_id if incoming else source_wh_id
-
-                # Use current date for consistent stock calculation
-                # Don't use future dates (date_to) as it causes inconsistent stock levels
-                return_date = now
-
-                return (warehouse_id or False, return_date)
-            except Exception:
-                return (False, now)
-        
-        # Prefetch virtual available
-        prefetch_virtual_available = defaultdict(set)
-        virtual_available_dict = {}
-        
+        # Context dihitung sekali per request, lines dikelompokkan per (timeline?, context)
+        now = fields.Datetime.now()
+        context_by_request = {}
+        line_ids_by_context = defaultdict(list)
         for line in storable_lines:
-            # Skip jika request_id tidak valid
-            if not line.request_id:
-                continue
-
-            # Cek apakah ini consuming (outgoing move)
-            is_consuming = line._is_consuming()
+            request = line.request_id
+            use_timeline = request._is_time_phased()
+            if request.id not in context_by_request:
+                context_by_request[request.id] = line._get_forecast_context(now=None if use_timeline else now)
+            context_key = tuple(sorted(context_by_request[request.id].items()))
+            line_ids_by_context[use_timeline, context_key].append(line.id)
 
-            # Use consistent logic regardless of state for stock checking
-            if is_consuming:
-                key = safe_key_virtual_available(line)
-                prefetch_virtual_available[key].add(line.product_id.id)
-
-            # Untuk incoming moves (optional)
-            elif line.request_id.picking_type_id and line.request_id.picking_type_id.code == 'incoming':
-                key = safe_key_virtual_available(line, incoming=True)
-                prefetch_virtual_available[key].add(line.product_id.id)
-        
-        # Read virtual available untuk semua keys
-        for key_context, product_ids in prefetch_virtual_available.items():
-            if not product_ids:
-                continue
+        # Satu read per (context, product set)
+        for (use_timeline, context_key), line_ids in line_ids_by_context.items():
+            lines = self.browse(line_ids)
             try:
-                warehouse_id, to_date = key_context
-                products = self.env['product.product'].browse(list(product_ids))
-                if warehouse_id:
-                    read_res = products.with_context(
-                        warehouse_id=warehouse_id, 
-                        to_date=to_date
-                    ).read(['virtual_available'])
+                if use_timeline:
+                    timelines = lines.product_id._get_availability_timeline_by_context(dict(context_key))
                 else:
-                    read_res = products.read(['virtual_available'])
-                
-                virtual_available_dict[key_context] = {res['id']: res['virtual_available'] or 0.0 for res in read_res}
+                    virtual_by_product = lines.product_id._get_virtual_available_by_context(dict(context_key))
             except Exception as e:
-                _logger.warning(f"Error reading virtual_available for products {product_ids}: {e}")
-                virtual_available_dict[key_context] = {pid: 0.0 for pid in product_ids}
-        
-        # Set forecast availability
-        for line in storable_lines:
-            if not line.request_id:
+                _logger.warning(f"Error reading virtual_available for products {lines.product_id.ids}: {e}")
                 continue
-                
-            try:
-                is_consuming = line._is_consuming()
-                
-                if is_consuming:
-                    key = safe_key_virtual_available(line)
-                    virtual_available = virtual_available_dict.get(key, {}).get(line.product_id.id, 0.0)
-                    line.forecast_availability = virtual_available - line.product_uom_qty
+
+            for line in lines:
+                if use_timeline:
+                    timeline = timelines[line.product_id.id]
+                    request = line.request_id
+                    line.forecast_availability = timeline.available_at(request.date_from) - line.product_uom_qty
+                    line.forecast_return_availability = timeline.available_at(request.date_to or request.date_from) - line.product_uom_qty
                 else:
-                    # Default untuk non-consuming: gunakan current stock dengan konsisten context
-                    stock_context = {'warehouse': line.request_id.request_warehouse_id.id} if line.request_id.request_warehouse_id else {}
-                    if line.request_id.location_id:
-                        try:
-                            stock_context['location'] = line.request_id.location_id.id
-                        except:
-                            pass
+                    line.forecast_availability = line.forecast_return_availability = \
+                        virtual_by_product.get(line.product_id.id, 0.0) - line.product_uom_qty
 
-                    line.forecast_availability = line.product_id.with_context(stock_context).virtual_available - line.product_uom_qty
-                    
-            except Exception as e:
-                _logger.warning(f"Error computing forecast for line {line.id}: {e}")
-                line.forecast_availability = 0.0
+    def _get_forecast_context(self, now=None):
+        """Stock context untuk forecast line ini.
+
+        Consuming line memakai warehouse asal; dengan ``now`` quantity dibatasi
+        sampai tanggal sekarang (date_to tidak dipakai karena membuat stock
+        level tidak konsisten). Line lain memakai stock context request (sama
+        dengan stock check).
+        """
+        self.ensure_one()
+        request = self.request_id
+        if self._is_consuming():
+            if request.location_id:
+                warehouse = request.location_id.warehouse_id
+            else:
+                warehouse = request.request_warehouse_id
+            if not warehouse:
+                return {}
+            stock_context = {'warehouse_id': warehouse.id}
+            if now:
+                stock_context['to_date'] = now
+            return stock_context
+        return request._get_stock_context()
 
     def _prepare_stock_move(self, pick=True):
         self.ensure_one()
@@ -335,7 +324,10 @@ class MaterialRequestLine(models.Model):
             'active_model': 'product.product',
             'move_to_match_ids': self.ids,
         }
-        if self._is_consuming():
+        if self.request_id._is_time_phased():
+            # Warehouse asal, sama dengan timeline forecast pickup/return
+            warehouse = self.request_id.location_id.warehouse_id or self.request_id.request_warehouse_id
+        elif self._is_consuming():
             warehouse = self.request_id.location_id.warehouse_id
         else:
             warehouse = self.request_id.location_dest_id.warehouse_id
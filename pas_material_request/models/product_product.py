@@ -0,0 +1,226 @@
+from collections import OrderedDict, defaultdict
+from itertools import accumulate
+import bisect
+import threading
+import time
+
+from odoo import api, fields, models
+from odoo.tools import float_round
+
+_TODO_MOVE_STATES = ('waiting', 'confirmed', 'assigned', 'partially_available')
+
+
+class StockAvailabilityCache:
+    """LRU cache in-process untuk forecast (virtual_available / timeline).
+
+    Key: (dbname, product_id, field_name, companies, stock_context). Entry
+    di-invalidate per product saat quant atau move product tersebut berubah,
+    dan expired setelah ``ttl`` detik untuk perubahan dari worker lain.
+
+    Karena perubahan dari worker lain baru terlihat setelah TTL, cache ini
+    hanya untuk tampilan forecast; stored compute dan keputusan approval
+    membaca qty on hand langsung dari database.
+    """
+
+    def __init__(self, max_size=20000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._keys_by_product = defaultdict(set)
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stamp = entry
+            if time.monotonic() - stamp > self.ttl:
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            self._keys_by_product[key[:2]].add(key)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, dbname, product_ids):
+        with self._lock:
+            for product_id in product_ids:
+                for key in self._keys_by_product.pop((dbname, product_id), ()):
+                    self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_product.clear()
+
+    def _discard(self, key):
+        self._entries.pop(key, None)
+        product_keys = self._keys_by_product.get(key[:2])
+        if product_keys is not None:
+            product_keys.discard(key)
+            if not product_keys:
+                del self._keys_by_product[key[:2]]
+
+
+availability_cache = StockAvailabilityCache()
+
+
+class AvailabilityTimeline:
+    """Proyeksi stock satu product: on hand + kumulatif scheduled move per hari.
+
+    ``available_at(date)`` adalah binary search di tanggal move, tanpa query.
+    """
+
+    __slots__ = ('on_hand', 'dates', 'cumulative')
+
+    def __init__(self, on_hand, delta_by_date):
+        self.on_hand = on_hand
+        self.dates = sorted(delta_by_date)
+        self.cumulative = list(accumulate(delta_by_date[date] for date in self.dates))
+
+    def available_at(self, date):
+        """Quantity yang diproyeksikan tersedia di akhir hari ``date``"""
+        index = bisect.bisect_right(self.dates, fields.Date.to_date(date))
+        return self.on_hand + (self.cumulative[index - 1] if index else 0.0)
+
+# Product yang stock-nya berubah di transaksi berjalan: tidak dibaca / diisi ke cache
+# sampai commit atau rollback, supaya data yang belum commit tidak bocor ke worker lain.
+_DIRTY_PRODUCTS_KEY = 'apm_material_request.availability_dirty_products'
+
+
+class ProductProduct(models.Model):
+    _inherit = 'product.product'
+
+    def _get_qty_available_by_context(self, stock_context):
+        """On hand quantity untuk semua product di self dalam satu grouped query
+
+        Selalu dibaca dari database (tanpa availability cache) karena dipakai
+        untuk stored compute, snapshot submit dan shortage saat approval.
+
+        :param stock_context: context stock yang sama dengan yang dipakai qty_available
+        :return: dict {product_id: qty_available}
+        """
+        if not self:
+            return {}
+        return self._read_qty_available(stock_context)
+
+    def _get_virtual_available_by_context(self, stock_context):
+        """Forecasted quantity untuk semua product di self, lewat availability cache
+
+        :return: dict {product_id: virtual_available}
+        """
+        return self._get_availability_by_context('virtual_available', stock_context)
+
+    def _get_availability_timeline_by_context(self, stock_context):
+        """Timeline incoming/outgoing scheduled move per product, lewat availability cache
+
+        :return: dict {product_id: AvailabilityTimeline}
+        """
+        return self._get_availability_by_context('timeline', stock_context)
+
+    def _get_availability_by_context(self, field_name, stock_context):
+        """Baca field_name ('virtual_available' / 'timeline') dari availability cache,
+        product yang belum ada di cache dihitung sekaligus"""
+        if not self:
+            return {}
+
+        dbname = self.env.cr.dbname
+        context_key = (tuple(self.env.companies.ids), self.env.su, tuple(sorted(stock_context.items())))
+        dirty_product_ids = self.env.cr.postcommit.data.get(_DIRTY_PRODUCTS_KEY, ())
+        # Context dengan tanggal (mis. to_date=now) hampir tidak pernah berulang, tidak di-cache
+        cacheable = not (stock_context.get('from_date') or stock_context.get('to_date'))
+
+        result = {}
+        missing_ids = []
+        for product_id in self.ids:
+            value = None
+            if cacheable and product_id not in dirty_product_ids:
+                value = availability_cache.get((dbname, product_id, field_name, context_key))
+            if value is None:
+                missing_ids.append(product_id)
+            else:
+                result[product_id] = value
+
+        if missing_ids:
+            missing = self.browse(missing_ids)
+            if field_name == 'timeline':
+                computed = missing._read_availability_timeline(stock_context)
+            else:
+                quantities = missing.with_context(stock_context)._compute_quantities_dict(
+                    stock_context.get('lot_id'), stock_context.get('owner_id'), stock_context.get('package_id'),
+                    stock_context.get('from_date'), stock_context.get('to_date'))
+                computed = {product_id: values[field_name] for product_id, values in quantities.items()}
+
+            for product_id, value in computed.items():
+                if cacheable and product_id not in dirty_product_ids:
+                    availability_cache.set((dbname, product_id, field_name, context_key), value)
+            result.update(computed)
+        return result
+
+    def _read_qty_available(self, stock_context):
+        """On hand quantity dengan satu grouped query ke stock.quant"""
+        domain_quant_loc = self.with_context(stock_context)._get_domain_locations()[0]
+        quant_groups = self.env['stock.quant'].with_context(active_test=False)._read_group(
+            [('product_id', 'in', self.ids)] + domain_quant_loc,
+            ['product_id'],
+            ['quantity:sum'],
+        )
+        qty_by_product = {product.id: quantity for product, quantity in quant_groups}
+
+        return {
+            product.id: float_round(qty_by_product.get(product.id, 0.0), precision_rounding=product.uom_id.rounding)
+            for product in self
+        }
+
+    def _read_availability_timeline(self, stock_context):
+        """On hand + scheduled move in/out per hari, satu grouped query per arah"""
+        _domain_quant_loc, domain_move_in_loc, domain_move_out_loc = self.with_context(stock_context)._get_domain_locations()
+        on_hand = self._read_qty_available(stock_context)
+        domain_todo = [('product_id', 'in', self.ids), ('state', 'in', _TODO_MOVE_STATES)]
+
+        Move = self.env['stock.move'].with_context(active_test=False)
+        delta_by_product = defaultdict(lambda: defaultdict(float))
+        for sign, domain_move_loc in ((1, domain_move_in_loc), (-1, domain_move_out_loc)):
+            move_groups = Move._read_group(domain_todo + domain_move_loc, ['product_id', 'date:day'], ['product_qty:sum'])
+            for product, day, quantity in move_groups:
+                delta_by_product[product.id][fields.Date.to_date(day)] += sign * quantity
+
+        return {
+            product.id: AvailabilityTimeline(on_hand[product.id], delta_by_product[product.id])
+            for product in self
+        }
+
+    @api.model
+    def _clear_availability_cache(self):
+        """Kosongkan seluruh availability cache worker ini (benchmark / pengukuran cold cache)"""
+        availability_cache.clear()
+
+    def _invalidate_availability_cache(self):
+        """Dipanggil saat quant / move product di self berubah"""
+        if not self:
+            return
+        dbname = self.env.cr.dbname
+        product_ids = set(self.ids)
+        availability_cache.invalidate(dbname, product_ids)
+
+        postcommit = self.env.cr.postcommit
+        dirty_product_ids = postcommit.data.get(_DIRTY_PRODUCTS_KEY)
+        if dirty_product_ids is None:
+            dirty_product_ids = postcommit.data[_DIRTY_PRODUCTS_KEY] = set()
+
+            @postcommit.add
+            def _invalidate_after_commit():
+                availability_cache.invalidate(dbname, dirty_product_ids)
+
+            @self.env.cr.postrollback.add
+            def _invalidate_after_rollback():
+                availability_cache.invalidate(dbname, dirty_product_ids)
+
+        dirty_product_ids.update(product_ids)
@@ -0,0 +1,74 @@
+from odoo import api, fields, models
+
+
+class ProductPurchaseHistory(models.Model):
+    _name = 'apm.product.purchase.history'
+    _description = 'Product Last Purchase'
+    _rec_name = 'product_id'
+    _order = 'date_order desc'
+
+    product_id = fields.Many2one('product.product', 'Product', required=True, index=True, ondelete='cascade', readonly=True)
+    company_id = fields.Many2one('res.company', 'Company', required=True, index=True, ondelete='cascade', readonly=True)
+    date_order = fields.Datetime('Last Purchase Date', readonly=True)
+    price_unit = fields.Float('Last Purchase Price', digits='Product Price', readonly=True)
+    currency_id = fields.Many2one('res.currency', 'Currency', readonly=True)
+    partner_id = fields.Many2one('res.partner', 'Vendor', readonly=True)
+    order_line_id = fields.Many2one('purchase.order.line', 'Purchase Order Line', readonly=True, ondelete='set null')
+
+    _sql_constraints = [
+        ('product_company_uniq', 'unique(product_id, company_id)', 'Last purchase harus unik per product dan company.'),
+    ]
+
+    def init(self):
+        self.env.cr.execute("SELECT 1 FROM apm_product_purchase_history LIMIT 1")
+        if not self.env.cr.rowcount:
+            self._refresh_products()
+
+    @api.model
+    def _refresh_products(self, products=None):
+        """Hitung ulang last purchase untuk products (semua product jika None) dari PO purchase/done"""
+        if products is not None and not products:
+            return
+        where_product = "AND pol.product_id IN %(product_ids)s" if products is not None else ""
+        params = {
+            'product_ids': tuple(products.ids) if products is not None else (),
+            'uid': self.env.uid,
+        }
+
+        self.env.flush_all()
+        if products is not None:
+            self.env.cr.execute(
+                "DELETE FROM apm_product_purchase_history WHERE product_id IN %(product_ids)s", params)
+        else:
+            self.env.cr.execute("DELETE FROM apm_product_purchase_history")
+
+        self.env.cr.execute(f"""
+            INSERT INTO apm_product_purchase_history (
+                product_id, company_id, date_order, price_unit, currency_id, partner_id, order_line_id,
+                create_uid, write_uid, create_date, write_date
+            )
+            SELECT DISTINCT ON (pol.product_id, po.company_id)
+                   pol.product_id, po.company_id, po.date_order, pol.price_unit, po.currency_id, po.partner_id, pol.id,
+                   %(uid)s, %(uid)s, NOW() AT TIME ZONE 'UTC', NOW() AT TIME ZONE 'UTC'
+              FROM purchase_order_line pol
+              JOIN purchase_order po ON po.id = pol.order_id
+             WHERE po.state IN ('purchase', 'done')
+               AND pol.product_id IS NOT NULL
+               {where_product}
+          ORDER BY pol.product_id, po.company_id, po.date_order DESC, pol.id DESC
+        """, params)
+        self.invalidate_model()
+
+    @api.model
+    def _get_last_purchase_map(self, products, companies):
+        """Satu lookup untuk semua (product, company)
+
+        :return: dict {(product_id, company_id): apm.product.purchase.history}
+        """
+        if not products or not companies:
+            return {}
+        histories = self.sudo().search([
+            ('product_id', 'in', products.ids),
+            ('company_id', 'in', companies.ids),
+        ])
+        return {(history.product_id.id, history.company_id.id): history for history in histories}
@@ -0,0 +1,22 @@
+from odoo import models
+
+_CONFIRMED_STATES = ('purchase', 'done')
+# Field PO yang disalin ke apm.product.purchase.history atau menentukan PO ikut dihitung
+_HISTORY_ORDER_FIELDS = {'state', 'date_order', 'partner_id', 'currency_id', 'company_id'}
+
+
+class PurchaseOrder(models.Model):
+    _inherit = 'purchase.order'
+
+    def write(self, vals):
+        if not _HISTORY_ORDER_FIELDS.intersection(vals):
+            return super().write(vals)
+
+        # PO yang masuk/keluar dari status purchase/done, atau header PO confirmed yang diubah,
+        # mengubah last purchase product-nya
+        was_confirmed = self.filtered(lambda po: po.state in _CONFIRMED_STATES)
+        res = super().write(vals)
+        confirmed = was_confirmed | self.filtered(lambda po: po.state in _CONFIRMED_STATES)
+        if confirmed:
+            self.env['apm.product.purchase.history']._refresh_products(confirmed.order_line.product_id)
+        return res
@@ -0,0 +1,36 @@
+from odoo import api, models
+
+from .purchase_order import _CONFIRMED_STATES
+
+# Field line yang disalin ke apm.product.purchase.history
+_HISTORY_LINE_FIELDS = {'product_id', 'price_unit', 'order_id'}
+
+
+class PurchaseOrderLine(models.Model):
+    _inherit = 'purchase.order.line'
+
+    def _get_confirmed_products(self):
+        """Product dari line yang PO-nya purchase/done, yaitu yang tercatat di purchase history"""
+        return self.filtered(lambda line: line.order_id.state in _CONFIRMED_STATES).product_id
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        # Line baru di PO yang sudah confirmed
+        self.env['apm.product.purchase.history']._refresh_products(lines._get_confirmed_products())
+        return lines
+
+    def write(self, vals):
+        if not _HISTORY_LINE_FIELDS.intersection(vals):
+            return super().write(vals)
+
+        products = self._get_confirmed_products()
+        res = super().write(vals)
+        self.env['apm.product.purchase.history']._refresh_products(products | self._get_confirmed_products())
+        return res
+
+    def unlink(self):
+        products = self._get_confirmed_products()
+        res = super().unlink()
+        self.env['apm.product.purchase.history']._refresh_products(products)
+        return res
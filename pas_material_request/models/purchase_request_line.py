@@ -11,6 +11,17 @@ class PurchaseRequestLine(models.Model):
         help="Line dari Material Request yang memicu PR line ini"
     )
 
+    material_request_line_ids = fields.Many2many(
+        'apm.material.request.line',
+        relation='apm_mr_line_purchase_request_line_rel',
+        column1='purchase_request_line_id',
+        column2='material_request_line_id',
+        string='Material Request Lines',
+        readonly=True,
+        copy=False,
+        help="Semua line Material Request yang shortage-nya dipenuhi PR line ini (termasuk konsolidasi)"
+    )
+
     last_purchase_price = fields.Monetary(
         string='Last Purchase Price',
         compute='_compute_last_purchase_info',
@@ -29,21 +40,13 @@ class PurchaseRequestLine(models.Model):
     @api.depends('product_id')
     def _compute_last_purchase_info(self):
         """Compute last purchase price and date from purchase order lines"""
+        last_purchases = self.env['apm.product.purchase.history']._get_last_purchase_map(
+            self.product_id, self.company_id | self.env.company)
         for line in self:
-            if not line.product_id:
-                line.last_purchase_price = 0.0
-                line.last_purchase_date = False
-                continue
-
-            # Search for the last purchase order line for this product
-            last_po_line = self.env['purchase.order.line'].search([
-                ('product_id', '=', line.product_id.id),
-                ('order_id.state', 'in', ['purchase', 'done']),
-            ], order='date_order desc', limit=1)
-
-            if last_po_line:
-                line.last_purchase_price = last_po_line.price_unit
-                line.last_purchase_date = last_po_line.date_order.date()
+            last_purchase = last_purchases.get((line.product_id.id, (line.company_id or self.env.company).id))
+            if last_purchase:
+                line.last_purchase_price = last_purchase.price_unit
+                line.last_purchase_date = last_purchase.date_order.date() if last_purchase.date_order else False
             else:
                 line.last_purchase_price = 0.0
-                line.last_purchase_date = False
\ No newline at end of file
+                line.last_purchase_date = False
@@ -0,0 +1,24 @@
+from odoo import fields, models
+
+
+class ResCompany(models.Model):
+    _inherit = 'res.company'
+
+    mr_approver_id = fields.Many2one(
+        'res.users', string='Material Request Approver',
+        help="Approver WH default untuk Material Request baru. Jika kosong, "
+             "dipakai user dari group Sales / User: Own Documents Only"
+    )
+
+    mr_async_approval = fields.Boolean(
+        string='Async Material Request Approval',
+        help="Approve Material Request diantrikan dan diproses di background oleh cron. "
+             "Batas waktu cron worker (limit_time_real_cron, default limit_time_real) harus lebih "
+             "lama dari approval MR terbesar; job yang berulang kali terhenti ditandai Failed."
+    )
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'mr_approver_id' in vals:
+            self.env['apm.material.request']._clear_resolver_cache()
+        return res
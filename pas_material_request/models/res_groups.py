@@ -0,0 +1,11 @@
+from odoo import models
+
+
+class ResGroups(models.Model):
+    _inherit = 'res.groups'
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'users' in vals:
+            self.env['apm.material.request']._clear_resolver_cache()
+        return res
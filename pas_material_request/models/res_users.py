@@ -0,0 +1,29 @@
+from odoo import api, models
+
+from .material_request import _DEFAULT_APPROVER_GROUP
+
+
+class ResUsers(models.Model):
+    _inherit = 'res.users'
+
+    def _is_mr_approver_candidate(self):
+        """True jika salah satu user di self anggota group approver default Material Request"""
+        group = self.env.ref(_DEFAULT_APPROVER_GROUP, raise_if_not_found=False)
+        return bool(group) and any(group in user.groups_id for user in self)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        users = super().create(vals_list)
+        # User baru di group approver bisa menjadi approver default
+        if users._is_mr_approver_candidate():
+            self.env['apm.material.request']._clear_resolver_cache()
+        return users
+
+    def write(self, vals):
+        # name/login menentukan urutan approver dan active ikut filter search, tapi hanya
+        # relevan untuk anggota group approver; keanggotaan hanya berubah lewat groups_id
+        candidate = {'active', 'name', 'login'}.intersection(vals) and self._is_mr_approver_candidate()
+        res = super().write(vals)
+        if 'groups_id' in vals or candidate:
+            self.env['apm.material.request']._clear_resolver_cache()
+        return res
@@ -0,0 +1,28 @@
+from odoo import api, models
+
+# Field yang dibaca resolver location Material Request (search internal location per company)
+_RESOLVER_FIELDS = {'active', 'company_id', 'usage'}
+
+
+class StockLocation(models.Model):
+    _inherit = 'stock.location'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        locations = super().create(vals_list)
+        if any(location.usage == 'internal' for location in locations):
+            self.env['apm.material.request']._clear_resolver_cache()
+        return locations
+
+    def write(self, vals):
+        res = super().write(vals)
+        if _RESOLVER_FIELDS.intersection(vals):
+            self.env['apm.material.request']._clear_resolver_cache()
+        return res
+
+    def unlink(self):
+        internal = any(location.usage == 'internal' for location in self)
+        res = super().unlink()
+        if internal:
+            self.env['apm.material.request']._clear_resolver_cache()
+        return res
@@ -1,10 +1,22 @@
 from odoo import api, fields, models
+from odoo.tools.sql import column_exists, create_column, table_exists
+
+# Field move yang mempengaruhi qty_available / virtual_available
+_AVAILABILITY_FIELDS = {
+    'state', 'product_id', 'product_uom_qty', 'product_uom', 'quantity', 'date',
+    'location_id', 'location_dest_id',
+}
 
 
 class StockMove(models.Model):
     _inherit = 'stock.move'
     
     material_request_line_id = fields.Many2one('apm.material.request.line', 'Material Request Line', index='btree_not_null')
+    # Disimpan di move supaya valuation tidak perlu traverse line -> request per move
+    material_request_type = fields.Selection(
+        related='material_request_line_id.request_id.request_type',
+        string='Material Request Type',
+        store=True)
     
     shipment_condition = fields.Integer(compute='_check_full_shipment')
     
@@ -17,15 +29,53 @@ class StockMove(models.Model):
                 move.shipment_condition = 1
             else:
                 move.shipment_condition = -1
+
+    def _auto_init(self):
+        # Isi kolom baru dengan SQL, supaya install tidak menghitung related untuk semua move lewat ORM.
+        # Saat install baru, tabel line sudah ada tapi stock_move.material_request_line_id belum:
+        # kolom itu baru dibuat oleh super()._auto_init(), jadi belum ada yang perlu diisi.
+        cr = self.env.cr
+        if not column_exists(cr, 'stock_move', 'material_request_type'):
+            create_column(cr, 'stock_move', 'material_request_type', 'varchar')
+            if (table_exists(cr, 'apm_material_request_line')
+                    and column_exists(cr, 'stock_move', 'material_request_line_id')):
+                cr.execute("""
+                    UPDATE stock_move move
+                       SET material_request_type = request.request_type
+                      FROM apm_material_request_line line
+                      JOIN apm_material_request request ON request.id = line.request_id
+                     WHERE line.id = move.material_request_line_id
+                """)
+        return super()._auto_init()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        moves = super().create(vals_list)
+        moves.product_id._invalidate_availability_cache()
+        return moves
+
+    def write(self, vals):
+        if not _AVAILABILITY_FIELDS.intersection(vals):
+            return super().write(vals)
+        products = self.product_id
+        res = super().write(vals)
+        (products | self.product_id)._invalidate_availability_cache()
+        return res
+
+    def unlink(self):
+        products = self.product_id
+        res = super().unlink()
+        products._invalidate_availability_cache()
+        return res
                 
     def _get_src_account(self, accounts_data):
-        if self.material_request_line_id.request_id.request_type == 'inventory':
+        if self.material_request_type == 'inventory':
             return accounts_data['expense'].id
         
         return super()._get_src_account(accounts_data)
 
     def _get_dest_account(self, accounts_data):
-        if self.material_request_line_id.request_id.request_type == 'inventory':
+        if self.material_request_type == 'inventory':
             return accounts_data['expense'].id
         
         return super()._get_dest_account(accounts_data)
\ No newline at end of file
@@ -5,12 +5,15 @@ class StockPicking(models.Model):
     _inherit = 'stock.picking'
     
     
-    mr_count = fields.Integer(string="Material Request Count", compute='_get_material_request')
+    mr_count = fields.Integer(string="Material Request Count", compute='_compute_mr_count')
     mr_ids = fields.Many2many(
         comodel_name='apm.material.request',
+        relation='apm_material_request_stock_picking_rel',
+        column1='picking_id',
+        column2='request_id',
         string="Material Request",
         compute='_get_material_request',
-        search='_search_mr_ids',
+        store=True,
         copy=False)
     
     return_date = fields.Date(
@@ -22,11 +25,20 @@ class StockPicking(models.Model):
     )
     
     
-    shipment_condition = fields.Integer(compute='_check_full_shipment')
+    # -1: partial, 0: ada move kosong, 1: full. Stored supaya bisa difilter di list picking
+    shipment_condition = fields.Integer(compute='_check_full_shipment', store=True, index=True)
     
-    @api.depends('move_ids_without_package.shipment_condition')
+    @api.depends(
+        'move_ids.product_uom_qty', 'move_ids.quantity', 'move_ids.package_level_id', 'move_ids.scrap_id',
+        'picking_type_id.show_entire_packs')
     def _check_full_shipment(self):
+        # Record asli dihitung dari database; record onchange (NewId, termasuk picking yang
+        # sedang diedit) dari move di cache supaya quantity yang belum disimpan ikut dihitung
+        conditions = self.filtered(lambda rec: isinstance(rec.id, int))._read_shipment_conditions()
         for rec in self:
+            if rec.id in conditions:
+                rec.shipment_condition = conditions[rec.id]
+                continue
             shipment_condition = rec.move_ids_without_package.mapped('shipment_condition')
             if -1 in shipment_condition:
                 rec.shipment_condition = -1
@@ -34,16 +46,50 @@ class StockPicking(models.Model):
                 rec.shipment_condition = 0
             else:
                 rec.shipment_condition = 1
+
+    def _read_shipment_conditions(self):
+        """Shipment condition semua picking di self dari satu grouped query atas move-nya
+
+        Move yang dihitung sama dengan move_ids_without_package: tanpa move
+        scrap, dan tanpa move dalam package level jika picking type picking
+        menampilkan entire packs.
+
+        :return: dict {picking_id: shipment_condition}
+        """
+        if not self.ids:
+            return {}
+        self.env['stock.move'].flush_model(['picking_id', 'product_uom_qty', 'quantity', 'package_level_id', 'scrap_id'])
+        self.flush_model(['picking_type_id'])
+        self.env['stock.picking.type'].flush_model(['show_entire_packs'])
+        self.env.cr.execute("""
+            SELECT move.picking_id,
+                   BOOL_OR(move.product_uom_qty != 0 AND move.quantity != 0 AND move.product_uom_qty != move.quantity),
+                   BOOL_OR(COALESCE(move.product_uom_qty, 0) = 0 OR COALESCE(move.quantity, 0) = 0)
+              FROM stock_move move
+              JOIN stock_picking picking ON picking.id = move.picking_id
+         LEFT JOIN stock_picking_type picking_type ON picking_type.id = picking.picking_type_id
+             WHERE move.picking_id IN %s
+               AND move.scrap_id IS NULL
+               AND (move.package_level_id IS NULL OR NOT COALESCE(picking_type.show_entire_packs, FALSE))
+          GROUP BY move.picking_id
+        """, [tuple(self.ids)])
+        conditions = dict.fromkeys(self.ids, 1)
+        for picking_id, has_partial, has_empty in self.env.cr.fetchall():
+            if has_partial:
+                conditions[picking_id] = -1
+            elif has_empty:
+                conditions[picking_id] = 0
+        return conditions
     
-    @api.depends('move_ids_without_package.material_request_line_id')
+    @api.depends('move_ids.material_request_line_id')
     def _get_material_request(self):
         for picking in self:
-            material_request = picking.move_ids_without_package.mapped('material_request_line_id.request_id')
-            picking.mr_ids = material_request
-            picking.mr_count = len(material_request)
-            
-    def _search_mr_ids(self, operator, value):
-        return [('move_ids_without_package.material_request_line_id', operator, value)]
+            picking.mr_ids = picking.move_ids.material_request_line_id.request_id
+
+    @api.depends('mr_ids')
+    def _compute_mr_count(self):
+        for picking in self:
+            picking.mr_count = len(picking.mr_ids)
 
     def action_view_material_request(self):
         mrs = self.mapped('mr_ids')
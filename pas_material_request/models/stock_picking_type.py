@@ -0,0 +1,25 @@
+from odoo import api, models
+
+# Field yang mempengaruhi resolver picking type / location Material Request
+_RESOLVER_FIELDS = {'active', 'code', 'company_id', 'default_location_src_id', 'sequence', 'warehouse_id'}
+
+
+class StockPickingType(models.Model):
+    _inherit = 'stock.picking.type'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        picking_types = super().create(vals_list)
+        self.env['apm.material.request']._clear_resolver_cache()
+        return picking_types
+
+    def write(self, vals):
+        res = super().write(vals)
+        if _RESOLVER_FIELDS.intersection(vals):
+            self.env['apm.material.request']._clear_resolver_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env['apm.material.request']._clear_resolver_cache()
+        return res
@@ -0,0 +1,23 @@
+from odoo import api, models
+
+
+class StockQuant(models.Model):
+    _inherit = 'stock.quant'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        quants = super().create(vals_list)
+        quants.product_id._invalidate_availability_cache()
+        return quants
+
+    def write(self, vals):
+        products = self.product_id
+        res = super().write(vals)
+        (products | self.product_id)._invalidate_availability_cache()
+        return res
+
+    def unlink(self):
+        products = self.product_id
+        res = super().unlink()
+        products._invalidate_availability_cache()
+        return res
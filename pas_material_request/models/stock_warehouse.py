@@ -1,5 +1,31 @@
-from odoo import fields, models
+from odoo import api, fields, models
+
+# Field yang mempengaruhi resolver picking type / location / default warehouse Material Request
+_RESOLVER_FIELDS = {'active', 'company_id', 'int_type_id', 'lot_stock_id', 'sequence'}
 
 
 class StockWarehouse(models.Model):
-    _inherit = 'stock.warehouse'
\ No newline at end of file
+    _inherit = 'stock.warehouse'
+
+    mr_consolidate_purchase_request = fields.Boolean(
+        string='Consolidate MR Shortages',
+        help="Shortage Material Request dari warehouse ini dikumpulkan terjadwal menjadi satu "
+             "Purchase Request per company, satu line per product, alih-alih satu PR per MR"
+    )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        warehouses = super().create(vals_list)
+        self.env['apm.material.request']._clear_resolver_cache()
+        return warehouses
+
+    def write(self, vals):
+        res = super().write(vals)
+        if _RESOLVER_FIELDS.intersection(vals):
+            self.env['apm.material.request']._clear_resolver_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env['apm.material.request']._clear_resolver_cache()
+        return res
@@ -0,0 +1,151 @@
+import logging
+
+from odoo import api, fields, models
+from odoo.tools.sql import create_index
+
+from ..models.material_request import _STATES
+
+_logger = logging.getLogger(__name__)
+
+_REFRESH_DATE_PARAM = 'apm_material_request.report_refresh_date'
+_REFRESH_CHUNK_SIZE = 1000
+
+
+class MaterialRequestReport(models.Model):
+    """Tabel KPI fulfilment Material Request, satu baris per MR.
+
+    Diisi dengan SQL oleh _refresh_requests (bukan lewat ORM create) dan
+    di-refresh incremental oleh cron untuk MR yang berubah saja.
+    """
+    _name = 'apm.material.request.report'
+    _description = 'Material Request Fulfilment Analysis'
+    _order = 'date desc'
+    _rec_name = 'request_id'
+
+    request_id = fields.Many2one('apm.material.request', 'Material Request', readonly=True, index=True, ondelete='cascade')
+    company_id = fields.Many2one('res.company', 'Company', readonly=True)
+    department_id = fields.Many2one('hr.department', 'Department', readonly=True)
+    vessel_id = fields.Many2one('kapal.master', 'Vessel', readonly=True)
+    purchase_type = fields.Selection([('kapal', 'Kapal'), ('ga', 'G&A')], 'Jenis Pembelian', readonly=True)
+    request_type = fields.Selection([('inventory', 'Issue Material'), ('internal', 'Transfer')], 'Request Type', readonly=True)
+    state = fields.Selection(_STATES, 'Status', readonly=True)
+    date = fields.Date('Request Date', readonly=True)
+
+    request_count = fields.Integer('# Requests', readonly=True)
+    line_count = fields.Integer('# Lines', readonly=True)
+    demand_qty = fields.Float('Demand', digits='Product Unit of Measure', readonly=True)
+    shortage_qty = fields.Float('Shortage', digits='Product Unit of Measure', readonly=True)
+    delivered_qty = fields.Float('Delivered', digits='Product Unit of Measure', readonly=True)
+    returned_qty = fields.Float('Returned', digits='Product Unit of Measure', readonly=True)
+    lead_time_days = fields.Float(
+        'Fulfilment Lead Time (Days)', readonly=True, aggregator='avg',
+        help="Hari dari MR dibuat sampai delivery pertama done")
+    late_return_count = fields.Integer('# Late Returns', readonly=True)
+
+    _sql_constraints = [
+        ('request_uniq', 'unique(request_id)', 'Satu baris report per Material Request.'),
+    ]
+
+    def init(self):
+        # Deteksi MR yang berubah sejak refresh terakhir
+        for table in ('apm_material_request', 'apm_material_request_line'):
+            create_index(self.env.cr, f'{table}_write_date_idx', table, ['write_date'])
+
+        self.env.cr.execute("SELECT 1 FROM apm_material_request_report LIMIT 1")
+        if not self.env.cr.rowcount:
+            self._refresh_all()
+
+    @api.model
+    def _refresh_all(self):
+        """Bangun ulang seluruh report per chunk MR"""
+        self.env.cr.execute("SELECT id FROM apm_material_request ORDER BY id")
+        request_ids = [row[0] for row in self.env.cr.fetchall()]
+        for index in range(0, len(request_ids), _REFRESH_CHUNK_SIZE):
+            self._refresh_requests(request_ids[index:index + _REFRESH_CHUNK_SIZE])
+        self.env['ir.config_parameter'].sudo().set_param(_REFRESH_DATE_PARAM, fields.Datetime.to_string(fields.Datetime.now()))
+
+    @api.model
+    def _cron_refresh(self):
+        """Refresh incremental: MR yang header / line-nya berubah, atau jatuh tempo, sejak refresh terakhir"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        last_refresh = ICP.get_param(_REFRESH_DATE_PARAM)
+        if not last_refresh:
+            self._refresh_all()
+            return
+
+        now = fields.Datetime.now()
+        self.env.flush_all()
+        # next_action_date: MR yang menjadi late dihitung ulang meski cron late status belum jalan
+        self.env.cr.execute("""
+            SELECT id FROM apm_material_request WHERE write_date >= %(since)s
+             UNION
+            SELECT request_id FROM apm_material_request_line WHERE write_date >= %(since)s
+             UNION
+            SELECT id FROM apm_material_request WHERE next_action_date >= %(since)s AND next_action_date < %(now)s
+        """, {'since': last_refresh, 'now': now})
+        request_ids = sorted(row[0] for row in self.env.cr.fetchall())
+        for index in range(0, len(request_ids), _REFRESH_CHUNK_SIZE):
+            self._refresh_requests(request_ids[index:index + _REFRESH_CHUNK_SIZE])
+        ICP.set_param(_REFRESH_DATE_PARAM, fields.Datetime.to_string(now))
+        _logger.info("Material request report refreshed for %s requests", len(request_ids))
+
+    @api.model
+    def _refresh_requests(self, request_ids):
+        """Hitung ulang baris report untuk request_ids dengan satu DELETE + INSERT ... SELECT"""
+        if not request_ids:
+            return
+        self.env.flush_all()
+        params = {'request_ids': tuple(request_ids), 'uid': self.env.uid}
+        self.env.cr.execute("DELETE FROM apm_material_request_report WHERE request_id IN %(request_ids)s", params)
+        self.env.cr.execute("""
+            INSERT INTO apm_material_request_report (
+                request_id, company_id, department_id, vessel_id, purchase_type, request_type, state, date,
+                request_count, line_count, demand_qty, shortage_qty, delivered_qty, returned_qty,
+                lead_time_days, late_return_count,
+                create_uid, write_uid, create_date, write_date
+            )
+            SELECT mr.id, mr.company_id, employee.department_id, mr.vessel_id, mr.purchase_type, mr.request_type, mr.state,
+                   COALESCE(mr.request_date, mr.date_from),
+                   1,
+                   COALESCE(line.line_count, 0),
+                   COALESCE(line.demand_qty, 0),
+                   COALESCE(mr.insufficient_stock_qty, 0),
+                   COALESCE(line.delivered_qty, 0),
+                   COALESCE(line.returned_qty, 0),
+                   EXTRACT(EPOCH FROM (move.first_delivery_date - mr.create_date)) / 86400.0,
+                   CASE WHEN mr.mr_status_info = 'Late Return'
+                          OR move.last_return_date::date > mr.date_to THEN 1 ELSE 0 END,
+                   %(uid)s, %(uid)s, NOW() AT TIME ZONE 'UTC', NOW() AT TIME ZONE 'UTC'
+              FROM apm_material_request mr
+         LEFT JOIN LATERAL (
+                    SELECT emp.department_id
+                      FROM hr_employee emp
+                     WHERE emp.user_id = mr.requested_by_id
+                       AND emp.company_id = mr.company_id
+                  ORDER BY emp.id
+                     LIMIT 1
+                   ) employee ON TRUE
+         LEFT JOIN (
+                    SELECT request_id,
+                           COUNT(*) AS line_count,
+                           SUM(product_uom_qty) AS demand_qty,
+                           SUM(move_quantity) AS delivered_qty,
+                           SUM(move_returned) AS returned_qty
+                      FROM apm_material_request_line
+                     WHERE request_id IN %(request_ids)s
+                  GROUP BY request_id
+                   ) line ON line.request_id = mr.id
+         LEFT JOIN (
+                    SELECT mr_line.request_id,
+                           MIN(sm.date) FILTER (WHERE picking.return_id IS NULL) AS first_delivery_date,
+                           MAX(sm.date) FILTER (WHERE picking.return_id IS NOT NULL) AS last_return_date
+                      FROM stock_move sm
+                      JOIN apm_material_request_line mr_line ON mr_line.id = sm.material_request_line_id
+                 LEFT JOIN stock_picking picking ON picking.id = sm.picking_id
+                     WHERE sm.state = 'done'
+                       AND mr_line.request_id IN %(request_ids)s
+                  GROUP BY mr_line.request_id
+                   ) move ON move.request_id = mr.id
+             WHERE mr.id IN %(request_ids)s
+        """, params)
+        self.invalidate_model()
@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from odoo import fields
+from odoo.fields import Command
+from odoo.tests.common import TransactionCase
+
+
+class MaterialRequestCommon(TransactionCase):
+    # Jumlah line kecil dan besar untuk query budget; jumlah query keduanya harus sama
+    SMALL = 5
+    LARGE = 50  # 10x SMALL
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.company = cls.env.company
+        cls.user = cls.env.user
+
+        # MR butuh department dari employee user yang membuat request
+        cls.department = cls.env['hr.department'].create({
+            'name': "MR Test Department",
+            'company_id': cls.company.id,
+        })
+        employee = cls.user.employee_id
+        if employee:
+            employee.department_id = cls.department
+        else:
+            cls.env['hr.employee'].create({
+                'name': cls.user.name,
+                'user_id': cls.user.id,
+                'company_id': cls.company.id,
+                'department_id': cls.department.id,
+            })
+
+        cls.warehouse, cls.vessel_warehouse = cls.env['stock.warehouse'].create([{
+            'name': f"MR Test WH {index}",
+            'code': f"MRT{index}",
+            'company_id': cls.company.id,
+        } for index in range(2)])
+        cls.vessel = cls.env['kapal.master'].create({
+            'name': "MR Test Vessel",
+            'vessel_code': "MRTV",
+            'category': 'tugboat',
+            'destination_id': cls.vessel_warehouse.id,
+        })
+        cls.products = cls.env['product.product'].create([{
+            'name': f"MR Test Part {index}",
+            'default_code': f"MRT-{index:03d}",
+            'type': 'consu',
+            'is_storable': True,
+        } for index in range(cls.LARGE)])
+        for product in cls.products:
+            cls.env['stock.quant']._update_available_quantity(product, cls.warehouse.lot_stock_id, 10.0)
+
+    def _request_vals(self, line_count, request_type='internal'):
+        today = fields.Date.context_today(self.env.user)
+        return {
+            'request_type': request_type,
+            'purchase_type': 'kapal',
+            'vessel_id': self.vessel.id,
+            'request_warehouse_id': self.warehouse.id,
+            'assigned_to_id': self.user.id,
+            'date_from': today,
+            'date_to': today + timedelta(days=1) if request_type == 'internal' else False,
+            'line_ids': [Command.create({
+                'product_id': product.id,
+                'product_uom_qty': 1.0,
+            }) for product in self.products[:line_count]],
+        }
+
+    def _create_request(self, line_count, request_type='internal'):
+        return self.env['apm.material.request'].create(self._request_vals(line_count, request_type))
+
+    def _create_approved_request(self, line_count, request_type='internal'):
+        request = self._create_request(line_count, request_type)
+        request.button_to_approve()
+        request.button_approved()
+        return request
+
+    def _reset_caches(self):
+        """Cache ORM dan availability dingin sebelum diukur"""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        self.env['product.product']._clear_availability_cache()
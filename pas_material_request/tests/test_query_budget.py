@@ -0,0 +1,168 @@
+from odoo.fields import Command
+from odoo.tests import tagged
+
+from .common import MaterialRequestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestMaterialRequestQueryBudget(MaterialRequestCommon):
+    """Jumlah query hot path Material Request tidak boleh bertambah seiring jumlah line.
+
+    Setiap hot path diukur untuk SMALL dan LARGE line setelah satu warm-up
+    supaya ormcache sudah terisi. Jumlah query LARGE harus sama dengan SMALL
+    (toleransi QUERY_GROWTH_TOLERANCE), dan SMALL tidak boleh melebihi budget.
+    """
+
+    # Selisih yang masih diterima antara LARGE dan SMALL (mis. sequence/batch yang terpecah)
+    QUERY_GROWTH_TOLERANCE = 2
+
+    def _count_queries(self, run, data):
+        self._reset_caches()
+        query_start = self.cr.sql_log_count
+        run(data)
+        self.env.flush_all()
+        return self.cr.sql_log_count - query_start
+
+    def _assert_flat_query_count(self, budget, prepare, run):
+        """prepare(count) menyiapkan data di luar hitungan, run(data) yang diukur"""
+        run(prepare(self.SMALL))
+        small_queries = self._count_queries(run, prepare(self.SMALL))
+        large_queries = self._count_queries(run, prepare(self.LARGE))
+        self.assertLessEqual(
+            small_queries, budget,
+            f"{small_queries} queries untuk {self.SMALL} line, budget {budget}")
+        self.assertLessEqual(
+            large_queries - small_queries, self.QUERY_GROWTH_TOLERANCE,
+            f"Query bertambah seiring jumlah line: {small_queries} ({self.SMALL} line) "
+            f"-> {large_queries} ({self.LARGE} line)")
+
+    def test_create_request(self):
+        self._assert_flat_query_count(
+            45,
+            self._request_vals,
+            lambda vals: self.env['apm.material.request'].create(vals),
+        )
+
+    def test_button_to_approve(self):
+        self._assert_flat_query_count(
+            40,
+            self._create_request,
+            lambda request: request.button_to_approve(),
+        )
+
+    def test_button_approved(self):
+        def prepare(count):
+            request = self._create_request(count)
+            request.button_to_approve()
+            return request
+
+        self._assert_flat_query_count(
+            180,
+            prepare,
+            lambda request: request.button_approved(),
+        )
+
+    def test_request_list(self):
+        def prepare(count):
+            Request = self.env['apm.material.request']
+            return Request.concat(*(self._create_approved_request(1) for _i in range(count)))
+
+        self._assert_flat_query_count(
+            15,
+            prepare,
+            lambda requests: requests.search_read(
+                [('id', 'in', requests.ids)],
+                ['name', 'state', 'picking_count', 'mr_status', 'mr_status_info', 'delivery_status']),
+        )
+
+    def test_picking_list(self):
+        def prepare(count):
+            Request = self.env['apm.material.request']
+            return Request.concat(*(self._create_approved_request(1) for _i in range(count))).picking_ids
+
+        self._assert_flat_query_count(
+            12,
+            prepare,
+            lambda pickings: pickings.search_read(
+                [('id', 'in', pickings.ids)],
+                ['name', 'state', 'mr_ids', 'mr_count', 'shipment_condition']),
+        )
+
+    def test_purchase_request_line_create(self):
+        def run(line_vals_list):
+            purchase_request = self.env['purchase.request'].create({'line_ids': line_vals_list})
+            purchase_request.line_ids.read(['last_purchase_price', 'last_purchase_date'])
+
+        self._assert_flat_query_count(
+            60,
+            lambda count: [Command.create({
+                'product_id': product.id,
+                'product_qty': 1.0,
+            }) for product in self.products[:count]],
+            run,
+        )
+
+    def test_compute_forecast_information(self):
+        """Forecast line Issue Material (consuming) dan Transfer (non-consuming) sekaligus"""
+        def prepare(count):
+            requests = self._create_request(count, 'inventory') | self._create_request(count, 'internal')
+            return requests.line_ids
+
+        self._assert_flat_query_count(
+            20,
+            prepare,
+            lambda lines: lines._compute_forecast_information(),
+        )
+
+    def _setup_real_time_valuation(self):
+        """Product test dipindah ke kategori valuation real time; return expense account"""
+        Account = self.env['account.account']
+        stock_valuation, stock_input, stock_output = Account.create([{
+            'name': f"MR Test {name}",
+            'code': f"MRT{index}",
+            'account_type': 'asset_current',
+        } for index, name in enumerate(('Stock Valuation', 'Stock Input', 'Stock Output'), start=1)])
+        expense = Account.create({
+            'name': "MR Test Expense",
+            'code': "MRT4",
+            'account_type': 'expense',
+        })
+        journal = self.env['account.journal'].create({
+            'name': "MR Test Stock Journal",
+            'code': "MRTS",
+            'type': 'general',
+        })
+        self.products.product_tmpl_id.write({
+            'standard_price': 10.0,
+            'categ_id': self.env['product.category'].create({
+                'name': "MR Test Real Time",
+                'property_cost_method': 'standard',
+                'property_valuation': 'real_time',
+                'property_stock_valuation_account_id': stock_valuation.id,
+                'property_stock_account_input_categ_id': stock_input.id,
+                'property_stock_account_output_categ_id': stock_output.id,
+                'property_account_expense_categ_id': expense.id,
+                'property_stock_journal': journal.id,
+            }).id,
+        })
+        return expense
+
+    def test_inventory_picking_valuation_accounts(self):
+        """Validasi picking Issue Material: move dijurnal ke expense, lookup account tidak query per move"""
+        expense = self._setup_real_time_valuation()
+
+        def prepare(count):
+            delivery = self._create_approved_request(count, 'inventory').picking_ids
+            for move in delivery.move_ids:
+                move.write({'quantity': move.product_uom_qty, 'picked': True})
+            delivery._action_done()
+            self.assertEqual(delivery.state, 'done')
+            self.assertTrue(all(move.material_request_type == 'inventory' for move in delivery.move_ids))
+            self.assertIn(expense, delivery.move_ids.stock_valuation_layer_ids.account_move_id.line_ids.account_id)
+            return delivery.move_ids
+
+        def run(moves):
+            for move in moves:
+                move._get_accounting_data_for_valuation()
+
+        self._assert_flat_query_count(10, prepare, run)
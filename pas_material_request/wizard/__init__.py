@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+
+from . import material_request_line_import
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import csv
+import io
+import logging
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import float_compare, split_every
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+_logger = logging.getLogger(__name__)
+
+# Header file (case-insensitive) -> key internal
+_COLUMNS = {
+    'default_code': 'default_code',
+    'code': 'default_code',
+    'part number': 'default_code',
+    'quantity': 'quantity',
+    'qty': 'quantity',
+    'uom': 'uom',
+    'description': 'description',
+    'engine_type': 'engine_type',
+    'interval_hour': 'interval_hour',
+    'for_machine_side': 'for_machine_side',
+}
+_REQUIRED_COLUMNS = ('default_code', 'quantity')
+# Jumlah baris yang divalidasi per lookup product
+_IMPORT_BATCH_SIZE = 1000
+
+
+def _normalize_code(value):
+    """Part number numerik di XLSX dibaca openpyxl sebagai float (12345.0), samakan dengan default_code"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value if value is not None else '').strip()
+
+
+class MaterialRequestLineImport(models.TransientModel):
+    _name = 'apm.material.request.line.import'
+    _description = 'Import Material Request Lines'
+
+    request_id = fields.Many2one('apm.material.request', string='Material Request', required=True, ondelete='cascade')
+    file_data = fields.Binary(string='File', required=True, attachment=False)
+    file_name = fields.Char(string='File Name')
+    error_log = fields.Text(string='Errors', readonly=True)
+
+    @api.model
+    def default_get(self, fields_list):
+        res = super().default_get(fields_list)
+        if self.env.context.get('active_model') == 'apm.material.request' and 'request_id' in fields_list:
+            res['request_id'] = self.env.context.get('active_id')
+        return res
+
+    def button_import(self):
+        self.ensure_one()
+        if self.request_id.state != 'draft':
+            raise UserError(_("Lines hanya bisa di-import ke Material Request dengan status Draft."))
+
+        vals_list, errors, row_count = self._prepare_line_vals(self._iter_rows())
+        if not row_count:
+            raise UserError(_("File tidak berisi baris data."))
+
+        if errors:
+            # Tidak ada line yang dibuat selama masih ada baris yang gagal
+            self.error_log = '\n'.join(errors)
+            return {
+                'type': 'ir.actions.act_window',
+                'res_model': self._name,
+                'res_id': self.id,
+                'view_mode': 'form',
+                'target': 'new',
+            }
+
+        lines = self.env['apm.material.request.line'].create(vals_list)
+        _logger.info(f"Imported {len(lines)} lines ke {self.request_id.name} dari {self.file_name}")
+        self.request_id.message_post(body=_("%(count)s lines di-import dari %(file)s", count=len(lines), file=self.file_name))
+        return {'type': 'ir.actions.act_window_close'}
+
+    def _iter_rows(self):
+        """Yield (row_number, {column: value}) dari CSV / XLSX, satu baris per iterasi"""
+        content = base64.b64decode(self.file_data)
+        if (self.file_name or '').lower().endswith('.xlsx'):
+            if openpyxl is None:
+                raise UserError(_("Library openpyxl dibutuhkan untuk import file XLSX."))
+            workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+            reader = workbook.active.iter_rows(values_only=True)
+        else:
+            text = io.TextIOWrapper(io.BytesIO(content), encoding='utf-8-sig', newline='')
+            sample = text.read(4096)
+            text.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+            except csv.Error:
+                dialect = csv.excel
+            reader = csv.reader(text, dialect)
+
+        header = next(reader, None) or ()
+        columns = [_COLUMNS.get(str(name or '').strip().lower()) for name in header]
+        missing = [name for name in _REQUIRED_COLUMNS if name not in columns]
+        if missing:
+            raise UserError(_("Kolom wajib tidak ditemukan di header: %s", ', '.join(missing)))
+
+        for row_number, row in enumerate(reader, start=2):
+            if not any(value not in (None, '') for value in row):
+                continue
+            yield row_number, {
+                column: value.strip() if isinstance(value, str) else value
+                for column, value in zip(columns, row) if column
+            }
+
+    def _prepare_line_vals(self, rows):
+        """Validasi baris dalam satu pass atas iterator rows, per batch _IMPORT_BATCH_SIZE.
+
+        Product di-lookup per batch untuk kode yang belum pernah dicari; UoM dan
+        selection dibangun sekali.
+
+        :return: (vals_list, errors, row_count)
+        """
+        request = self.request_id
+        uoms = self.env['uom.uom'].search_fetch([], ['name', 'category_id'])
+        uoms_by_name = {uom.name.lower(): uom for uom in uoms}
+
+        Line = self.env['apm.material.request.line']
+        selections = {
+            fname: dict(Line._fields[fname]._description_selection(self.env))
+            for fname in ('engine_type', 'for_machine_side')
+        }
+
+        products_by_code = {}
+        vals_list = []
+        errors = []
+        row_count = 0
+        for batch in split_every(_IMPORT_BATCH_SIZE, rows, list):
+            row_count += len(batch)
+            codes = {_normalize_code(values.get('default_code')) for _row_number, values in batch}
+            codes -= products_by_code.keys() | {''}
+            if codes:
+                for code in codes:
+                    products_by_code[code] = []
+                products = self.env['product.product'].search_fetch([
+                    ('default_code', 'in', list(codes)),
+                    ('type', '=', 'consu'),
+                    ('company_id', 'in', [False, request.company_id.id]),
+                ], ['default_code', 'uom_id'])
+                for product in products:
+                    products_by_code[product.default_code].append(product)
+
+            for row_number, values in batch:
+                line_vals = self._prepare_row_vals(
+                    row_number, values, products_by_code, uoms_by_name, selections, errors)
+                if line_vals:
+                    vals_list.append(line_vals)
+        return vals_list, errors, row_count
+
+    def _prepare_row_vals(self, row_number, values, products_by_code, uoms_by_name, selections, errors):
+        """Vals line untuk satu baris, atau None jika baris gagal (error ditambahkan ke errors)"""
+        code = _normalize_code(values.get('default_code'))
+        if not code:
+            errors.append(_("Baris %(row)s: default_code kosong", row=row_number))
+            return None
+        candidates = products_by_code.get(code)
+        if not candidates:
+            errors.append(_("Baris %(row)s: product dengan kode '%(code)s' tidak ditemukan", row=row_number, code=code))
+            return None
+        if len(candidates) > 1:
+            errors.append(_("Baris %(row)s: kode '%(code)s' dipakai lebih dari satu product", row=row_number, code=code))
+            return None
+        product = candidates[0]
+
+        try:
+            quantity = float(values.get('quantity') or 0.0)
+        except (TypeError, ValueError):
+            errors.append(_("Baris %(row)s: quantity '%(qty)s' bukan angka", row=row_number, qty=values.get('quantity')))
+            return None
+        if float_compare(quantity, 0.0, precision_digits=6) <= 0:
+            errors.append(_("Baris %(row)s: quantity harus lebih dari 0", row=row_number))
+            return None
+
+        line_vals = {
+            'request_id': self.request_id.id,
+            'product_id': product.id,
+            'product_uom_qty': quantity,
+        }
+
+        uom_name = str(values.get('uom') or '')
+        if uom_name:
+            uom = uoms_by_name.get(uom_name.lower())
+            if not uom:
+                errors.append(_("Baris %(row)s: UoM '%(uom)s' tidak ditemukan", row=row_number, uom=uom_name))
+                return None
+            if uom.category_id != product.uom_id.category_id:
+                errors.append(_("Baris %(row)s: UoM '%(uom)s' tidak sesuai kategori UoM product %(code)s",
+                                row=row_number, uom=uom_name, code=code))
+                return None
+            line_vals['product_uom_id'] = uom.id
+
+        if values.get('description'):
+            line_vals['name'] = str(values['description'])
+
+        if values.get('interval_hour') not in (None, ''):
+            try:
+                line_vals['interval_hour'] = float(values['interval_hour'])
+            except (TypeError, ValueError):
+                errors.append(_("Baris %(row)s: interval_hour '%(value)s' bukan angka",
+                                row=row_number, value=values['interval_hour']))
+                return None
+
+        for fname, selection in selections.items():
+            value = str(values.get(fname) or '')
+            if not value:
+                continue
+            # Terima key maupun label selection
+            key = value if value in selection else next(
+                (k for k, label in selection.items() if label.lower() == value.lower()), None)
+            if key is None:
+                errors.append(_("Baris %(row)s: nilai %(field)s '%(value)s' tidak valid",
+                                row=row_number, field=fname, value=value))
+                return None
+            line_vals[fname] = key
+        return line_vals
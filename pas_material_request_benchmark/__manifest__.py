@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+{
+    'name': "Material Request Benchmark",
+
+    'summary': """Synthetic data benchmark untuk workflow Material Request""",
+
+    'description': """
+Generate dataset sintetis (warehouse, product, vessel, quant, MR dan line) lalu
+ukur wall time dan jumlah query SQL setiap hot path Material Request.
+
+Jalankan dari odoo shell sebagai superuser::
+
+    report = env['apm.material.request.benchmark'].sudo()._run_benchmark(requests=100, lines_per_request=50)
+    json.dump(report, open('/tmp/mr_bench.json', 'w'), indent=2)
+
+Data benchmark selalu di-rollback setelah pengukuran.
+
+Query budget per hot path ada di test apm_material_request
+(``tests/test_query_budget.py``, tag ``post_install``).
+    """,
+
+    'author': "Adhigana Perkasa Mandiri",
+    'website': "http://www.adhiganacorp.com",
+
+    'category': 'Hidden/Tools',
+    'version': '18.0.0.0',
+
+    'depends': ['apm_material_request'],
+
+    'data': [],
+
+    'license': 'OPL-1'
+
+}
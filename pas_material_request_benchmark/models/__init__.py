@@ -0,0 +1 @@
+from . import material_request_benchmark
@@ -0,0 +1,232 @@
+from contextlib import contextmanager
+from datetime import timedelta
+import json
+import logging
+import random
+import string
+import time
+
+from odoo import api, fields, models, release, _
+from odoo.exceptions import AccessError
+
+
+_logger = logging.getLogger(__name__)
+
+_DEFAULT_PARAMETERS = {
+    'warehouses': 3,
+    'products': 500,
+    'vessels': 10,
+    'requests': 50,
+    'lines_per_request': 20,
+    'seed': 42,
+}
+
+
+class _BenchmarkRollback(Exception):
+    """Dipakai untuk membatalkan savepoint benchmark"""
+
+
+class MaterialRequestBenchmark(models.AbstractModel):
+    _name = 'apm.material.request.benchmark'
+    _description = 'Material Request Benchmark'
+
+    @api.model
+    def _run_benchmark(self, **parameters):
+        """Generate dataset sintetis lalu ukur hot path Material Request.
+
+        Hanya untuk superuser (odoo shell); dataset selalu di-rollback.
+
+        :param parameters: override _DEFAULT_PARAMETERS (warehouses, products,
+            vessels, requests, lines_per_request, seed)
+        :return: dict report {'parameters', 'odoo_version', 'database', 'steps'}
+        """
+        self._check_benchmark_access()
+        unknown = set(parameters) - set(_DEFAULT_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown benchmark parameters: {', '.join(sorted(unknown))}")
+        params = {**_DEFAULT_PARAMETERS, **parameters}
+
+        report = {
+            'parameters': params,
+            'odoo_version': release.version,
+            'database': self.env.cr.dbname,
+            'date': fields.Datetime.to_string(fields.Datetime.now()),
+            'steps': [],
+        }
+        try:
+            with self.env.cr.savepoint():
+                self._run_steps(params, report)
+                raise _BenchmarkRollback()
+        except _BenchmarkRollback:
+            pass
+        finally:
+            self.env.invalidate_all()
+            self.env['product.product']._clear_availability_cache()
+
+        _logger.info(f"Material request benchmark: {json.dumps(report)}")
+        return report
+
+    @api.model
+    def _check_benchmark_access(self):
+        if not self.env.is_superuser():
+            raise AccessError(_("Benchmark Material Request hanya bisa dijalankan sebagai superuser."))
+
+    @contextmanager
+    def _measure(self, report, name, count):
+        """Catat wall time dan jumlah query untuk satu step, dengan cache dingin"""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        self.env['product.product']._clear_availability_cache()
+        cr = self.env.cr
+        query_start = cr.sql_log_count
+        time_start = time.perf_counter()
+        yield
+        self.env.flush_all()
+        wall_time = time.perf_counter() - time_start
+        queries = cr.sql_log_count - query_start
+        report['steps'].append({
+            'name': name,
+            'records': count,
+            'wall_time': round(wall_time, 4),
+            'queries': queries,
+            'queries_per_record': round(queries / count, 2) if count else None,
+        })
+
+    def _run_steps(self, params, report):
+        rng = random.Random(params['seed'])
+        dataset = self._generate_dataset(params, rng)
+        requests = dataset['requests']
+
+        Line = self.env['apm.material.request.line']
+        with self._measure(report, 'create_lines', len(dataset['line_vals_list'])):
+            lines = Line.create(dataset['line_vals_list'])
+
+        with self._measure(report, 'compute_insufficient_stock', len(requests)):
+            requests._compute_insufficient_stock()
+
+        with self._measure(report, 'compute_forecast_information', len(lines)):
+            lines._compute_forecast_information()
+
+        with self._measure(report, 'button_to_approve', len(requests)):
+            requests.button_to_approve()
+
+        # Separuh MR yang shortage dipakai untuk PR langsung, sisanya lewat button_approved
+        short_requests = requests.filtered('has_insufficient_stock')
+        pr_requests = short_requests[:len(short_requests) // 2]
+        with self._measure(report, 'create_auto_purchase_request', len(pr_requests)):
+            for record in pr_requests:
+                record._create_auto_purchase_request()
+
+        approve_requests = requests - pr_requests
+        with self._measure(report, 'button_approved', len(approve_requests)):
+            approve_requests.button_approved()
+
+        self._process_deliveries(approve_requests)
+        approved_lines = approve_requests.line_ids
+        with self._measure(report, 'compute_qty', len(approved_lines)):
+            approved_lines._compute_qty()
+
+        report['dataset'] = {
+            'lines': len(lines),
+            'pickings': len(approve_requests.picking_ids),
+            'return_pickings': len(approve_requests.picking_ids.filtered('return_id')),
+            'purchase_requests': len(requests.purchase_request_id),
+        }
+
+    def _generate_dataset(self, params, rng):
+        """Buat warehouse, product, vessel, quant dan header MR; line hanya disiapkan vals-nya"""
+        company = self.env.company
+        user = self.env.user
+        tag = ''.join(rng.choice(string.ascii_uppercase) for _i in range(2))
+
+        self._ensure_department(company, tag)
+
+        warehouses = self.env['stock.warehouse'].create([{
+            'name': f"Benchmark {tag} WH {index}",
+            'code': f"{tag}{index:03d}",
+            'company_id': company.id,
+        } for index in range(params['warehouses'])])
+
+        products = self.env['product.product'].create([{
+            'name': f"Benchmark {tag} Part {index}",
+            'default_code': f"BENCH-{tag}-{index:05d}",
+            'type': 'consu',
+            'is_storable': True,
+        } for index in range(params['products'])])
+
+        vessels = self.env['kapal.master'].create([{
+            'name': f"Benchmark {tag} Vessel {index}",
+            'vessel_code': f"{tag}V{index:03d}",
+            'category': 'tugboat',
+            'destination_id': warehouses[index % len(warehouses)].id,
+        } for index in range(params['vessels'])])
+
+        # ~30% kosong supaya ada shortage dan auto purchase request
+        Quant = self.env['stock.quant']
+        for warehouse in warehouses:
+            for product in products:
+                if rng.random() < 0.3:
+                    continue
+                Quant._update_available_quantity(product, warehouse.lot_stock_id, float(rng.randint(1, 20)))
+
+        today = fields.Date.context_today(self)
+        requests = self.env['apm.material.request']
+        line_vals_list = []
+        lines_per_request = min(params['lines_per_request'], len(products))
+        for index in range(params['requests']):
+            vessel = vessels[index % len(vessels)]
+            # Warehouse asal dibuat berbeda dari destination vessel supaya Transfer punya return picking
+            source_warehouses = warehouses - vessel.destination_id or warehouses
+            request_type = 'internal' if index % 2 else 'inventory'
+            request = requests.create({
+                'company_id': company.id,
+                'request_type': request_type,
+                'purchase_type': 'kapal',
+                'vessel_id': vessel.id,
+                'request_warehouse_id': rng.choice(source_warehouses).id,
+                'assigned_to_id': user.id,
+                'date_from': today,
+                'date_to': today + timedelta(days=7) if request_type == 'internal' else False,
+            })
+            requests |= request
+            line_vals_list += [{
+                'request_id': request.id,
+                'product_id': product.id,
+                'product_uom_qty': float(rng.randint(1, 10)),
+            } for product in rng.sample(list(products), lines_per_request)]
+
+        return {
+            'warehouses': warehouses,
+            'products': products,
+            'vessels': vessels,
+            'requests': requests,
+            'line_vals_list': line_vals_list,
+        }
+
+    def _ensure_department(self, company, tag):
+        """MR butuh department dari employee user yang menjalankan benchmark"""
+        if 'hr.employee' not in self.env:
+            return
+        employee = self.env.user.employee_id
+        if employee.department_id:
+            return
+        department = self.env['hr.department'].create({
+            'name': f"Benchmark {tag}",
+            'company_id': company.id,
+        })
+        if employee:
+            employee.department_id = department
+        else:
+            self.env['hr.employee'].create({
+                'name': self.env.user.name,
+                'user_id': self.env.user.id,
+                'company_id': company.id,
+                'department_id': department.id,
+            })
+
+    def _process_deliveries(self, requests):
+        """Validate delivery picking supaya _compute_qty punya done move untuk dihitung"""
+        deliveries = requests.picking_ids.filtered(lambda p: not p.return_id and p.state not in ('done', 'cancel'))
+        for move in deliveries.move_ids:
+            move.write({'quantity': move.product_uom_qty, 'picked': True})
+        deliveries._action_done()